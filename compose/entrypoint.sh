@@ -9,8 +9,14 @@ if [ -n "$DB_HOST" ]; then
   done
 fi
 
-python manage.py migrate --noinput
-python manage.py collectstatic --noinput
+# per-worker metric snapshots from a previous run would be summed into /metrics
+rm -rf "${METRICS_DIR:-/tmp/minishop-metrics}"
 
-# Start Gunicorn
-exec gunicorn minishop.wsgi:application --bind 0.0.0.0:8000 --workers 3
+# migrate and collectstatic only when migrations or static files changed
+python manage.py prepare_startup
+
+# Start Gunicorn; worker class, worker count, preload and warm-up are set
+# in compose/gunicorn.conf.py. APP_SERVER=asgi serves minishop.asgi with
+# uvicorn workers, where the async cart endpoints don't hold a worker while
+# they wait.
+exec gunicorn -c compose/gunicorn.conf.py
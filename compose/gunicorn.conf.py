@@ -0,0 +1,105 @@
+"""Gunicorn settings for the web container (``gunicorn -c compose/gunicorn.conf.py``).
+
+Tuned through the environment:
+
+- GUNICORN_WORKER_CLASS: ``sync`` (default), ``gthread`` or ``uvicorn``
+  (APP_SERVER=asgi implies ``uvicorn``). ``uvicorn`` serves minishop.asgi
+  and defaults DB_CONN_MAX_AGE to 0;
+- WEB_CONCURRENCY: worker processes; by default 2 x CPUs + 1 for sync
+  workers and CPUs + 1 for the others, which don't block a process per request;
+- GUNICORN_THREADS: threads per gthread worker (4);
+- GUNICORN_PRELOAD: load the app in the master before forking (1);
+- GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER: recycle a worker
+  after this many requests, staggered so workers don't restart together;
+- GUNICORN_WARMUP: compile templates, resolve URLs, build the search index
+  and open DB connections before a worker takes traffic (1).
+
+With preload the warm-up runs once in the master, then ``gc.freeze()`` moves
+everything it allocated out of the collector's reach, so the collector in the
+workers doesn't write to (and un-share) the pages they inherited. Each worker
+only opens its own database connections.
+"""
+import gc
+import os
+import threading
+
+
+def _flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def cpu_count():
+    """CPUs this container may use: its cgroup quota, else the CPUs it may run on."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+_asgi = os.environ.get('APP_SERVER') == 'asgi'
+_kind = os.environ.get('GUNICORN_WORKER_CLASS') or ('uvicorn' if _asgi else 'sync')
+if _kind not in WORKER_CLASSES:
+    raise RuntimeError(f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}')
+if _asgi and _kind != 'uvicorn':
+    raise RuntimeError(f'APP_SERVER=asgi needs uvicorn workers, not GUNICORN_WORKER_CLASS={_kind}')
+if _kind == 'uvicorn' and not os.environ.get('DB_CONN_MAX_AGE'):
+    # Django doesn't support persistent DB connections under ASGI: the ORM
+    # runs on executor threads that the per-request cleanup doesn't reach.
+    # Set before the app (and its settings) load, in the master or the workers.
+    os.environ['DB_CONN_MAX_AGE'] = '0'
+
+wsgi_app = 'minishop.asgi:application' if _kind == 'uvicorn' else 'minishop.wsgi:application'
+worker_class = WORKER_CLASSES[_kind]
+workers = int(os.environ.get('WEB_CONCURRENCY') or (2 * cpu_count() + 1 if _kind == 'sync' else cpu_count() + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if _kind == 'gthread' else 1
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+preload_app = _flag('GUNICORN_PRELOAD', '1')
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+_warmup = _flag('GUNICORN_WARMUP', '1')
+
+
+def when_ready(server):
+    # the master, after loading the app (preload) and before forking any worker
+    if not (_warmup and preload_app):
+        return
+    from store import warmup
+    server.log.info('Warm-up: %s', warmup.warm_shared())
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # the worker, after loading the app and before it accepts connections
+    if not _warmup:
+        return
+    from store import warmup
+    if not preload_app:
+        worker.log.info('Warm-up: %s', warmup.warm_shared())
+    if _kind == 'uvicorn':
+        return  # requests use the executor's threads' connections, not this thread's
+    tpool = getattr(worker, 'tpool', None)
+    if tpool is None:
+        worker.log.debug('Warm-up: %s', warmup.warm_worker())
+        return
+    # gthread: connections belong to threads, so each pool thread opens its own
+    barrier = threading.Barrier(worker.cfg.threads)
+
+    def warm_thread():
+        barrier.wait(10)  # one task per thread: none can pick up a second one
+        return warmup.warm_worker()
+
+    jobs = [tpool.submit(warm_thread) for _ in range(worker.cfg.threads)]
+    worker.log.debug('Warm-up: %s', [job.result() for job in jobs])
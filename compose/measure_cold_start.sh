@@ -0,0 +1,29 @@
+#!/bin/sh
+# Cold-start time of the web container: from `docker compose restart web` to
+# the first successful response through nginx. Run before and after a change
+# (or with FORCE=1, which makes startup migrate and collect static files as
+# every start used to) to compare.
+set -e
+URL=${URL:-http://localhost/}
+RUNS=${RUNS:-3}
+
+now_ms() { python3 -c 'import time; print(time.time_ns() // 1000000)'; }
+
+if [ -n "$FORCE" ]; then
+  docker compose exec -T web rm -f /app/staticfiles/.collectstatic-stamp
+fi
+
+i=1
+while [ "$i" -le "$RUNS" ]; do
+  start=$(now_ms)
+  docker compose restart web >/dev/null 2>&1
+  until curl -fs -o /dev/null "$URL"; do
+    sleep 0.1
+  done
+  end=$(now_ms)
+  echo "run $i: $((end - start)) ms"
+  if [ -n "$FORCE" ]; then
+    docker compose exec -T web rm -f /app/staticfiles/.collectstatic-stamp
+  fi
+  i=$((i + 1))
+done
@@ -14,7 +14,10 @@ function getCookie(name) {
   }
   return cookieValue;
 }
-const csrftoken = getCookie('csrftoken');
+// read when sending: on cached pages the cookie arrives with the cart summary
+function csrfToken(){
+  return getCookie('csrftoken');
+}
 
 function updateBadge(count){
   const badge = document.getElementById('cart-badge');
@@ -22,24 +25,83 @@ function updateBadge(count){
   badge.textContent = count>0?count:'';
 }
 
+// Batched cart mutations: edits made within BATCH_DELAY ms of each other are
+// sent to /cart/batch_ajax/ as one ordered list of ops (one session load/save)
+const BATCH_DELAY = 350;
+let pendingOps = [];
+let pendingWaiters = [];
+let batchTimer = null;
+let inflight = Promise.resolve();
+
+function queueCartOp(op){
+  // a new quantity for a line replaces an earlier, still-unsent one
+  if(op.op === 'set'){
+    const last = pendingOps[pendingOps.length-1];
+    if(last && last.op === 'set' && last.pid === op.pid){ pendingOps.pop(); }
+  }
+  pendingOps.push(op);
+  clearTimeout(batchTimer);
+  batchTimer = setTimeout(flushCartOps, BATCH_DELAY);
+  return new Promise(resolve=>pendingWaiters.push(resolve));
+}
+
+function flushCartOps(){
+  clearTimeout(batchTimer);
+  batchTimer = null;
+  if(pendingOps.length===0) return inflight;
+  const ops = pendingOps, waiters = pendingWaiters;
+  pendingOps = []; pendingWaiters = [];
+  // keep batches ordered: the next one starts after this one has been applied
+  inflight = inflight.then(async ()=>{
+    let data = null;
+    try {
+      const resp = await fetch('/cart/batch_ajax/', {method:'POST', headers:{'X-CSRFToken':csrfToken(), 'Content-Type':'application/json'}, body:JSON.stringify({ops})});
+      if(resp.ok){
+        data = await resp.json();
+        applyCartBatchResult(data);
+      }
+    } finally {
+      waiters.forEach(resolve=>resolve(data));
+    }
+  });
+  return inflight;
+}
+
+// don't lose edits made just before leaving the page
+window.addEventListener('pagehide', function(){
+  if(pendingOps.length===0 || !navigator.sendBeacon) return;
+  clearTimeout(batchTimer);
+  const body = new URLSearchParams({'ops': JSON.stringify(pendingOps), 'csrfmiddlewaretoken': csrfToken() || ''});
+  navigator.sendBeacon('/cart/batch_ajax/', body);
+  pendingOps = [];
+});
+
+function applyCartBatchResult(data){
+  updateBadge(data.cart_count);
+  Object.entries(data.lines || {}).forEach(([pid, line])=>{
+    const subEl = document.querySelector(`[data-subtotal="${pid}"]`);
+    if(subEl && line.subtotal!==null) subEl.textContent = formatMoney(line.subtotal);
+  });
+  const cartTotalEl = document.getElementById('cart-total-all');
+  if(cartTotalEl && data.total_amount!==undefined) cartTotalEl.textContent = formatMoney(data.total_amount);
+  computeSelectedTotal();
+}
+
 // Add-to-cart handler
 async function addToCartAjax(productId, quantity=1, button=null){
-  const resp = await fetch(`/cart/add_ajax/${productId}/`,{method:'POST', headers:{'X-CSRFToken':csrftoken}, body:new URLSearchParams({'quantity': quantity})});
-  const data = await resp.json();
-  if(data.success){
-    updateBadge(data.cart_count);
-    if(button){
-      // show quick visual feedback
-      const orig = button.innerHTML;
-      button.innerHTML = 'Added';
-      setTimeout(()=> button.innerHTML = orig, 900);
-    }
+  const data = await queueCartOp({'op':'add', 'pid': String(productId), 'qty': quantity});
+  if(data && button){
+    // show quick visual feedback
+    const orig = button.innerHTML;
+    button.innerHTML = 'Added';
+    setTimeout(()=> button.innerHTML = orig, 900);
   }
 }
 
 // Intercept Add buttons on product list and detail
-function setupAddButtons(){
-  document.querySelectorAll('[data-add-product]').forEach(btn=>{
+// (root lets the catalog's infinite scroll wire up only the cards it appends)
+function setupAddButtons(root=document){
+  root.querySelectorAll('[data-add-product]').forEach(btn=>{
     btn.addEventListener('click', async function(e){
       e.preventDefault();
       const pid = this.dataset.addProduct;
@@ -55,21 +117,8 @@ function formatMoney(val){
   return parseFloat(val).toFixed(2);
 }
 
-async function updateQty(pid, qty, updateUI=true){
-  const body = new URLSearchParams({'pid': pid, 'quantity': qty});
-  const resp = await fetch('/cart/update_ajax/', {method:'POST', headers:{'X-CSRFToken':csrftoken}, body});
-  if(!resp.ok) return null;
-  const data = await resp.json();
-  updateBadge(data.cart_count);
-  if(updateUI){
-    // update item subtotal if present
-    const subEl = document.querySelector(`[data-subtotal="${pid}"]`);
-    if(subEl && data.item_subtotal!==undefined) subEl.textContent = formatMoney(data.item_subtotal);
-    // update global totals if necessary
-    const cartTotalEl = document.getElementById('cart-total-all');
-    if(cartTotalEl && data.total_amount!==undefined) cartTotalEl.textContent = formatMoney(data.total_amount);
-  }
-  return data;
+function updateQty(pid, qty){
+  return queueCartOp({'op':'set', 'pid': String(pid), 'qty': qty});
 }
 
 function computeSelectedTotal(){
@@ -94,38 +143,35 @@ function computeSelectedTotal(){
 function setupCartControls(){
   // plus/minus buttons
   document.querySelectorAll('.qty-decrease').forEach(btn=>{
-    btn.addEventListener('click', async function(e){
+    btn.addEventListener('click', function(e){
       e.preventDefault();
       const row = this.closest('.cart-item-row');
       const pid = row.dataset.pid;
       const input = row.querySelector('.qty-input');
       let qty = Math.max(1, parseInt(input.value || 1) - 1);
       input.value = qty;
-      await updateQty(pid, qty);
-      computeSelectedTotal();
+      updateQty(pid, qty);
     });
   });
   document.querySelectorAll('.qty-increase').forEach(btn=>{
-    btn.addEventListener('click', async function(e){
+    btn.addEventListener('click', function(e){
       e.preventDefault();
       const row = this.closest('.cart-item-row');
       const pid = row.dataset.pid;
       const input = row.querySelector('.qty-input');
       let qty = Math.max(1, parseInt(input.value || 1) + 1);
       input.value = qty;
-      await updateQty(pid, qty);
-      computeSelectedTotal();
+      updateQty(pid, qty);
     });
   });
   // input manual change
   document.querySelectorAll('.qty-input').forEach(inp=>{
-    inp.addEventListener('change', async function(e){
+    inp.addEventListener('change', function(e){
       const row = this.closest('.cart-item-row');
       const pid = row.dataset.pid;
       let qty = Math.max(1, parseInt(this.value || 1));
       this.value = qty;
-      await updateQty(pid, qty);
-      computeSelectedTotal();
+      updateQty(pid, qty);
     });
   });
   // selection checkboxes
@@ -136,20 +182,13 @@ function setupCartControls(){
   });
   // remove item
   document.querySelectorAll('.remove-item').forEach(btn=>{
-    btn.addEventListener('click', async function(e){
+    btn.addEventListener('click', function(e){
       e.preventDefault();
       const pid = this.dataset.pid;
-      const body = new URLSearchParams({'pid': pid, 'action': 'remove'});
-      const resp = await fetch('/cart/update_ajax/', {method:'POST', headers:{'X-CSRFToken':csrftoken}, body});
-      const data = await resp.json();
-      if(data.success){
-        // remove row
-        document.querySelector(`.cart-item-row[data-pid="${pid}"]`).remove();
-        const cartTotalEl = document.getElementById('cart-total-all');
-        if(cartTotalEl && data.total_amount!==undefined) cartTotalEl.textContent = formatMoney(data.total_amount);
-        updateBadge(data.cart_count);
-        computeSelectedTotal();
-      }
+      // drop the row right away; totals arrive with the batch response
+      document.querySelector(`.cart-item-row[data-pid="${pid}"]`).remove();
+      computeSelectedTotal();
+      queueCartOp({'op':'remove', 'pid': String(pid)});
     });
   });
   // checkout button
@@ -166,16 +205,20 @@ function setupCartControls(){
         }
         return;
       }
+      // make sure queued quantity edits are applied before checkout reads the cart
+      await flushCartOps();
       const body = new URLSearchParams();
       selected.forEach(pid=>body.append('selected', pid));
-      const resp = await fetch('/cart/checkout_prepare/', {method:'POST', headers:{'X-CSRFToken':csrftoken}, body});
+      const resp = await fetch('/cart/checkout_prepare/', {method:'POST', headers:{'X-CSRFToken':csrfToken()}, body});
       const data = await resp.json();
       if(data.success && data.redirect){
         window.location.href = data.redirect;
       } else {
         const warning = document.getElementById('checkout-warning');
         if(warning){
-          warning.textContent = 'Unable to prepare checkout. Please try again.';
+          warning.textContent = data.error === 'out_of_stock'
+            ? 'Some selected items are no longer available in that quantity. Please adjust your cart.'
+            : 'Unable to prepare checkout. Please try again.';
           warning.classList.remove('d-none');
         }
       }
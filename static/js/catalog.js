@@ -0,0 +1,75 @@
+// catalog.js - live availability on product pages, infinite scroll for the home page grid
+
+// cards and pages are cached HTML; sold-out state comes from the live availability counts
+function markSoldOut(root, available){
+  root.querySelectorAll('[data-add-product]').forEach(btn=>{
+    if(available[btn.dataset.addProduct] === 0){
+      btn.disabled = true;
+      btn.textContent = 'Sold out';
+    }
+  });
+  root.querySelectorAll('[data-available]').forEach(el=>{
+    const units = available[el.dataset.available] || 0;
+    el.innerHTML = units > 0 ? '<strong>Available:</strong> ' + units : '<span class="text-danger">Sold out</span>';
+  });
+}
+
+async function loadAvailability(root){
+  const ids = Array.from(root.querySelectorAll('[data-add-product]')).map(btn=>btn.dataset.addProduct);
+  if(ids.length === 0) return;
+  const resp = await fetch(`${root.dataset.availabilityUrl}?ids=${ids.join(',')}`);
+  if(resp.ok) markSoldOut(root, (await resp.json()).available);
+}
+
+function setupInfiniteScroll(){
+  const more = document.getElementById('catalog-more');
+  const grid = document.getElementById('product-grid');
+  if(!more || !grid) return;
+  let loading = false;
+
+  async function loadNext(){
+    const cursor = more.dataset.cursor;
+    if(loading || !cursor) return;
+    loading = true;
+    const params = new URLSearchParams({'sort': more.dataset.sort, 'cursor': cursor});
+    try {
+      const resp = await fetch(`${more.dataset.pageUrl}?${params}`);
+      if(!resp.ok) return;
+      const data = await resp.json();
+      const tmp = document.createElement('div');
+      tmp.innerHTML = data.html;
+      const added = Array.from(tmp.children);
+      added.forEach(el=>grid.appendChild(el));
+      added.forEach(el=>setupAddButtons(el));
+      added.forEach(el=>markSoldOut(el, data.available || {}));
+      if(data.next_cursor){
+        more.dataset.cursor = data.next_cursor;
+        const link = more.querySelector('a');
+        if(link) link.href = `?sort=${encodeURIComponent(more.dataset.sort)}&cursor=${encodeURIComponent(data.next_cursor)}`;
+      } else {
+        more.remove();
+        observer && observer.disconnect();
+      }
+    } finally {
+      loading = false;
+    }
+  }
+
+  // keep the plain link as a no-JS / no-IntersectionObserver fallback
+  let observer = null;
+  if('IntersectionObserver' in window){
+    observer = new IntersectionObserver(entries=>{
+      if(entries.some(e=>e.isIntersecting)) loadNext();
+    }, {rootMargin: '600px 0px'});
+    observer.observe(more);
+  }
+  more.querySelector('a')?.addEventListener('click', function(e){
+    e.preventDefault();
+    loadNext();
+  });
+}
+
+document.addEventListener('DOMContentLoaded', function(){
+  document.querySelectorAll('[data-availability-url]').forEach(loadAvailability);
+  setupInfiniteScroll();
+});
@@ -0,0 +1,40 @@
+// search.js - navbar autocomplete backed by /search/autocomplete/
+
+function setupSearchAutocomplete(){
+  const form = document.querySelector('[data-search-form]');
+  if(!form) return;
+  const input = form.querySelector('[data-search-input]');
+  const menu = form.querySelector('[data-search-suggestions]');
+  let timer = null;
+  let lastQuery = '';
+
+  function hide(){ menu.classList.remove('show'); }
+
+  async function suggest(){
+    const q = input.value.trim();
+    if(q === lastQuery) return;
+    lastQuery = q;
+    if(q.length < 2){ hide(); return; }
+    const resp = await fetch(`/search/autocomplete/?${new URLSearchParams({q})}`);
+    if(!resp.ok || q !== input.value.trim()) return;
+    const data = await resp.json();
+    menu.innerHTML = '';
+    data.results.forEach(r=>{
+      const a = document.createElement('a');
+      a.className = 'dropdown-item';
+      a.href = r.url;
+      a.textContent = r.name;
+      menu.appendChild(a);
+    });
+    menu.classList.toggle('show', data.results.length > 0);
+  }
+
+  input.addEventListener('input', function(){
+    clearTimeout(timer);
+    timer = setTimeout(suggest, 150);
+  });
+  input.addEventListener('keydown', function(e){ if(e.key === 'Escape') hide(); });
+  document.addEventListener('click', function(e){ if(!form.contains(e.target)) hide(); });
+}
+
+document.addEventListener('DOMContentLoaded', setupSearchAutocomplete);
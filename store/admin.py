@@ -1,13 +1,18 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from .models import Product, Order, OrderItem
+from . import images
+from .forms import ProductForm
+from .models import Product, Order, OrderItem, OutboxEvent
+from .pagination import EstimatedCountPaginator
+from .signals import products_changed
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     def image_tag(self, obj):
         if obj.image_url:
-            return format_html('<img src="{}" class="admin-thumb" style="width:80px;height:120px;object-fit:cover;" />', obj.image_url)
+            return format_html('<img src="{}" class="admin-thumb" style="width:80px;height:120px;object-fit:cover;" />', images.smallest(obj.image_url, 80))
         return '(no image)'
     image_tag.short_description = 'Image'
 
@@ -19,19 +24,85 @@ class ProductAdmin(admin.ModelAdmin):
         return mark_safe('<div style="margin-top:8px" id="product-image-preview">(no image)</div>')
     image_preview.short_description = 'Preview'
 
-    list_display = ('product_id', 'image_tag', 'name', 'price', 'stock', 'status')
+    list_display = ('product_id', 'image_tag', 'name', 'price', 'stock', 'reserved', 'status')
     # product_id is primary key and not editable - show it as readonly instead of a form field
-    readonly_fields = ('product_id', 'image_preview')
-    fields = ('name','description','price','stock','image_url','image_preview','status')
+    # reserved is maintained by checkout holds (store/reservations.py)
+    readonly_fields = ('product_id', 'image_preview', 'reserved')
+    # ProductForm carries the stock the page was opened with (see Product.save)
+    form = ProductForm
+    fields = ('name','description','price','stock','stock_loaded','reserved','image_url','image_preview','status')
     search_fields = ('name',)
+    actions = ('make_active', 'make_inactive')
+    # newest first by primary key: creation order without sorting the table
+    ordering = ('-product_id',)
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def _set_status(self, request, queryset, status):
+        # update() bypasses the post_save signal, so invalidate explicitly
+        pids = list(queryset.values_list('product_id', flat=True))
+        updated = Product.objects.filter(product_id__in=pids).update(status=status)
+        products_changed(pids)
+        self.message_user(request, f'{updated} product(s) marked {status}.')
+
+    def make_active(self, request, queryset):
+        self._set_status(request, queryset, 'ACTIVE')
+    make_active.short_description = 'Mark selected products ACTIVE'
+
+    def make_inactive(self, request, queryset):
+        self._set_status(request, queryset, 'INACTIVE')
+    make_inactive.short_description = 'Mark selected products INACTIVE'
 
     class Media:
         js = ('admin/js/image_preview.js',)
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    # a raw id input instead of a <select> listing every product in the catalog
+    raw_id_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_id', 'customer_name', 'customer_email', 'total_amount', 'created_at')
+    # both served by the index on Order.created_at
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    search_fields = ('=order_id', 'customer_email')
+    inlines = (OrderItemInline,)
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order_item_id', 'order', 'product', 'quantity', 'subtotal')
+    # order and product are rendered through __str__: join them instead of a query per row
+    list_select_related = ('order', 'product')
+    raw_id_fields = ('order', 'product')
+    ordering = ('-order_item_id',)
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'topic', 'handler', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status', 'topic', 'handler')
+    readonly_fields = ('event_id', 'topic', 'handler', 'payload', 'status', 'attempts', 'available_at', 'claim',
+                       'last_error', 'created_at', 'processed_at')
+    ordering = ('-event_id',)
+    actions = ('retry_events',)
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def retry_events(self, request, queryset):
+        updated = queryset.exclude(status=OutboxEvent.DONE).update(
+            status=OutboxEvent.PENDING, attempts=0, claim='', available_at=timezone.now())
+        self.message_user(request, f'{updated} event(s) queued for another attempt.')
+    retry_events.short_description = 'Retry selected events'
@@ -0,0 +1,185 @@
+"""HTTP load generation for the benchmark commands.
+
+Every virtual user is a thread with its own keep-alive connection and cookie
+jar, so session-backed flows such as the cart behave as they would for a
+browser. Scenarios are plain functions ``scenario(user)`` that issue requests
+through ``user.request(label, ...)``; ``run`` calls them in a loop from
+``concurrency`` threads and reports throughput and latency percentiles per
+label. ``spawn`` starts a local gunicorn to benchmark.
+"""
+import http.client
+import os
+import secrets
+import shutil
+import socket
+import string
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class User:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        # Django accepts a client-chosen CSRF secret sent as both cookie and header
+        csrf = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+        self.cookies = {'csrftoken': csrf}
+        self.headers = {'X-CSRFToken': csrf}
+        self.samples = []  # (label, seconds, ok, started)
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, label, method, path, data=None):
+        """Send one request and record its latency under ``label``; returns (status, body)."""
+        headers = dict(self.headers)
+        headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        status, payload = 0, b''
+        for attempt in (1, 2):  # one retry when the server closed a kept-alive connection
+            if self.conn is None:
+                self._connect()
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                status = response.status
+                for value in response.headers.get_all('Set-Cookie') or ():
+                    for name, morsel in SimpleCookie(value).items():
+                        self.cookies[name] = morsel.value
+                if response.will_close:
+                    self.close()
+                break
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if attempt == 2:
+                    status = 0
+        self.samples.append((label, time.perf_counter() - start, 200 <= status < 400, start))
+        return status, payload
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """{label: stats} plus an 'all' entry; latencies in milliseconds."""
+    by_label = {}
+    for label, seconds, ok in samples:
+        by_label.setdefault(label, []).append((seconds, ok))
+    by_label['all'] = [(seconds, ok) for _, seconds, ok in samples]
+    result = {}
+    for label, values in by_label.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in values)
+        result[label] = {
+            'requests': len(values),
+            'errors': sum(1 for _, ok in values if not ok),
+            'rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+        }
+    return result
+
+
+def run(base_url, scenario, concurrency, duration, setup=None, warmup=0.0):
+    """Run ``scenario`` from ``concurrency`` users for ``duration`` seconds.
+
+    ``setup(user)`` runs once per user before the clock starts; requests made
+    in the first ``warmup`` seconds are not counted.
+    """
+    users = [User(base_url) for _ in range(concurrency)]
+    ready = threading.Barrier(concurrency + 1)
+    go = threading.Barrier(concurrency + 1)
+    window = {}
+
+    def worker(user):
+        if setup:
+            setup(user)
+        ready.wait()
+        go.wait()
+        while time.perf_counter() < window['stop']:
+            scenario(user)
+        user.close()
+
+    threads = [threading.Thread(target=worker, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for user in users:
+        user.samples.clear()
+    window['start'] = time.perf_counter() + warmup
+    window['stop'] = window['start'] + duration
+    go.wait()
+    for thread in threads:
+        thread.join()
+    # a request counts if it started inside the window, so drop the warm-up
+    samples = [s for user in users for s in user.samples if s[3] >= window['start']]
+    return summarize([s[:3] for s in samples], time.perf_counter() - window['start'])
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, proc=None, timeout=30, interval=0.05):
+    """Poll ``url`` until it answers; returns the seconds it took."""
+    started = time.monotonic()
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return time.monotonic() - started
+        except OSError:
+            if (proc is not None and proc.poll() is not None) or time.monotonic() - started > timeout:
+                raise ServerError(f'{url} did not come up')
+            time.sleep(interval)
+
+
+@contextmanager
+def spawn(args, env=None, ready_path='/cart/summary_ajax/'):
+    """Run ``gunicorn <args>`` bound to a free local port until the block exits.
+
+    Yields (base URL, seconds from launch until ``ready_path`` answered).
+    """
+    if not shutil.which('gunicorn'):
+        raise ServerError('gunicorn is not installed')
+    port = free_port()
+    started = time.monotonic()
+    proc = subprocess.Popen(['gunicorn', *args, '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+                            env={**os.environ, **(env or {})}, stdout=sys.stderr, stderr=sys.stderr)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(url + ready_path, proc)
+        yield url, time.monotonic() - started
+    finally:
+        proc.terminate()
+        proc.wait(10)
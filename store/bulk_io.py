@@ -0,0 +1,257 @@
+"""Streaming CSV/JSONL helpers shared by the bulk import/export commands.
+
+Readers and writers work one row at a time and database reads walk the primary
+key in fixed-size chunks, so memory use depends on the chunk size, not on the
+number of rows.
+"""
+import csv
+import io
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order, OrderItem, Product
+
+FORMATS = ('csv', 'jsonl')
+PRODUCT_FIELDS = ('product_id', 'name', 'description', 'price', 'stock', 'image_url', 'status')
+PRODUCT_STATUSES = ('ACTIVE', 'INACTIVE')
+ORDER_FIELDS = ('order_id', 'created_at', 'customer_name', 'customer_email', 'customer_phone',
+                'shipping_address', 'total_amount')
+ORDER_ITEM_FIELDS = ('order_item_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'subtotal')
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+@contextmanager
+def open_text(path, mode):
+    """Open ``path`` for text I/O, with '-' meaning stdin/stdout."""
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+    else:
+        with open(path, mode, newline='', encoding='utf-8') as f:
+            yield f
+
+
+def read_rows(f, fmt):
+    """Yield ``(line_number, dict)`` for each record of a CSV or JSONL stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowError(f'invalid JSON: {exc}')
+                continue
+            yield line_number, row
+
+
+class RowWriter:
+    def __init__(self, f, fmt, fields):
+        self.fmt = fmt
+        self.fields = fields
+        self.f = f
+        if fmt == 'csv':
+            self.writer = csv.writer(f)
+            self.writer.writerow(fields)
+
+    def write(self, values):
+        if self.fmt == 'csv':
+            self.writer.writerow(values)
+        else:
+            self.f.write(json.dumps(dict(zip(self.fields, values)), default=str, separators=(',', ':')))
+            self.f.write('\n')
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_keyset(queryset, key, size):
+    """Yield lists of up to ``size`` objects from ``queryset`` in ``key`` order.
+
+    Each chunk is a separate ``WHERE key > last ORDER BY key LIMIT size`` query,
+    which stays cheap at any depth and, unlike ``iterator()`` on MySQL, never
+    buffers the whole result set client-side.
+    """
+    last = None
+    while True:
+        qs = queryset.order_by(key)
+        if last is not None:
+            qs = qs.filter(**{key + '__gt': last})
+        chunk = list(qs[:size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1][key] if isinstance(chunk[-1], dict) else getattr(chunk[-1], key)
+
+
+def clean_product_row(row):
+    """Validate one import record into Product field values.
+
+    Only the columns the record has are returned (an empty price, stock or
+    status counts as missing), so an upsert leaves the other fields of an
+    existing product alone. ``product_id`` is always there, None for rows
+    that should always be inserted. Raises RowError on bad data; unknown
+    columns are ignored.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError('record is not an object')
+
+    def text(name, max_length, required=False):
+        value = row.get(name)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise RowError(f'{name} is required')
+        if len(value) > max_length:
+            raise RowError(f'{name} longer than {max_length} characters')
+        return value
+
+    def given(name):
+        return row.get(name) not in (None, '')
+
+    values = {}
+    try:
+        values['product_id'] = int(row['product_id']) if given('product_id') else None
+        if given('price'):
+            values['price'] = Decimal(str(row['price'])).quantize(Decimal('0.01'))
+        if given('stock'):
+            values['stock'] = int(row['stock'])
+    except (TypeError, ValueError, InvalidOperation):
+        raise RowError('product_id, price or stock is not a number')
+    if 'price' in values and not Decimal(0) <= values['price'] < Decimal('1e8'):
+        raise RowError('price out of range')
+    if 'name' in row:
+        values['name'] = text('name', 100, required=True)
+    for name, max_length in (('description', 500), ('image_url', 255)):
+        if name in row:
+            values[name] = text(name, max_length)
+    if given('status'):
+        values['status'] = text('status', 10)
+        if values['status'] not in PRODUCT_STATUSES:
+            raise RowError(f'status must be one of {", ".join(PRODUCT_STATUSES)}')
+    return values
+
+
+def new_product_values(values):
+    """``values`` from clean_product_row completed for an insert; raises RowError
+    if the name or price is missing."""
+    for name in ('name', 'price'):
+        if name not in values:
+            raise RowError(f'{name} is required for a new product')
+    return {'description': '', 'stock': 0, 'image_url': '', 'status': 'ACTIVE', **values}
+
+
+def diff_product(product, values):
+    """{field: (old, new)} for the fields ``values`` would change on ``product``."""
+    return {
+        field: (getattr(product, field), value)
+        for field, value in values.items()
+        if field != 'product_id' and getattr(product, field) != value
+    }
+
+
+def product_export_rows(status=None, chunk_size=2000):
+    """Yield Product export tuples in PRODUCT_FIELDS order."""
+    qs = Product.objects.values(*PRODUCT_FIELDS)
+    if status:
+        qs = qs.filter(status=status)
+    for chunk in iter_keyset(qs, 'product_id', chunk_size):
+        for row in chunk:
+            yield tuple(row[f] for f in PRODUCT_FIELDS)
+
+
+def parse_date_range(start=None, end=None):
+    """Turn inclusive YYYY-MM-DD bounds into a half-open [start, end) datetime range.
+
+    Either bound may be empty. Raises ValueError for malformed dates.
+    """
+    bounds = []
+    for value, days in ((start, 0), (end, 1)):
+        if not value:
+            bounds.append(None)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'invalid date {value!r}, expected YYYY-MM-DD')
+        bounds.append(timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min)))
+    return tuple(bounds)
+
+
+def iter_order_chunks(start=None, end=None, chunk_size=1000):
+    """Yield lists of Orders created in [start, end), items and products prefetched.
+
+    Every chunk costs two queries (orders, then their items joined to the
+    product name) however many rows are exported.
+    """
+    items = OrderItem.objects.select_related('product').only(
+        'order_item_id', 'order_id', 'quantity', 'unit_price', 'subtotal', 'product__product_id', 'product__name')
+    qs = Order.objects.only(*ORDER_FIELDS).prefetch_related(Prefetch('items', queryset=items.order_by('order_item_id')))
+    if start:
+        qs = qs.filter(created_at__gte=start)
+    if end:
+        qs = qs.filter(created_at__lt=end)
+    yield from iter_keyset(qs, 'order_id', chunk_size)
+
+
+def _item_values(item):
+    return (item.order_item_id, item.product.product_id, item.product.name, item.quantity, item.unit_price, item.subtotal)
+
+
+def order_export_blocks(fmt, start=None, end=None, chunk_size=1000):
+    """Yield the export as text blocks, one per chunk of orders.
+
+    CSV has one row per order item (order columns repeated; orders without
+    items get one row with empty item columns). JSONL has one object per
+    order with its items nested.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(ORDER_FIELDS + ORDER_ITEM_FIELDS)
+    for chunk in iter_order_chunks(start, end, chunk_size):
+        for order in chunk:
+            order_values = tuple(getattr(order, f) for f in ORDER_FIELDS)
+            items = order.items.all()
+            if writer:
+                for item in items or [None]:
+                    writer.writerow(order_values + (_item_values(item) if item else ('',) * len(ORDER_ITEM_FIELDS)))
+            else:
+                record = dict(zip(ORDER_FIELDS, order_values))
+                record['items'] = [dict(zip(ORDER_ITEM_FIELDS, _item_values(item))) for item in items]
+                buf.write(json.dumps(record, default=str, separators=(',', ':')))
+                buf.write('\n')
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
@@ -0,0 +1,190 @@
+"""Session cart that stores only product ids and quantities.
+
+The session holds ``{'items': {pid: qty}, 'count': n, 'total': 'x.xx'}``; count
+and total are kept up to date as lines change, so the badge/summary endpoints
+never touch the database and an update only needs the prices of the lines it
+changes. Names, images and current prices are hydrated in one query when a
+page actually shows the lines (``hydrate``).
+
+Product ids are strings, as they are in the session's JSON.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+from .models import Product
+
+SESSION_KEY = 'cart'
+MAX_BATCH_OPS = 100
+BATCH_OPS = ('add', 'set', 'remove')
+
+
+class Cart:
+    def __init__(self, session):
+        self.session = session
+        data = session.get(SESSION_KEY) or {}
+        if data and 'items' not in data:
+            data = self._from_legacy(data)
+        self.items = {str(pid): int(qty) for pid, qty in data.get('items', {}).items()}
+        self.count = data.get('count', sum(self.items.values()))
+        total = data.get('total', '0.00')
+        # None means a line changed without a known price: call refresh_total()
+        self.total = Decimal(total) if total is not None else None
+
+    @staticmethod
+    def _from_legacy(data):
+        # carts written before this module: {pid: {'qty', 'name', 'price', 'image_url'}}
+        items = {pid: line['qty'] for pid, line in data.items()}
+        total = sum((Decimal(line['price']) * line['qty'] for line in data.values()), Decimal('0.00'))
+        return {'items': items, 'count': sum(items.values()), 'total': str(total)}
+
+    def __contains__(self, pid):
+        return str(pid) in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def qty(self, pid):
+        return self.items.get(str(pid), 0)
+
+    def set(self, pid, qty, price=None):
+        """Set a line's quantity (0 or less removes it); ``price`` is its unit price."""
+        pid = str(pid)
+        old = self.items.get(pid, 0)
+        qty = max(int(qty), 0)
+        if qty:
+            self.items[pid] = qty
+        else:
+            self.items.pop(pid, None)
+        self.count += qty - old
+        if price is None or self.total is None:
+            self.total = None
+        else:
+            self.total += Decimal(price) * (qty - old)
+        self.save()
+
+    def add(self, pid, qty, price=None):
+        self.set(pid, self.qty(pid) + int(qty), price)
+
+    def remove(self, pid, price=None):
+        self.set(pid, 0, price)
+
+    def refresh_total(self, prices):
+        """Recompute count and total from scratch; ``prices`` maps pid -> unit price."""
+        self.items = {pid: qty for pid, qty in self.items.items() if pid in prices}
+        self.count = sum(self.items.values())
+        self.total = sum((prices[pid] * qty for pid, qty in self.items.items()), Decimal('0.00'))
+        self.save()
+
+    def apply(self, ops, prices):
+        """Apply parsed batch ``ops`` in order; ``prices`` covers every pid they name.
+
+        Returns ``(touched, errors)``: the pids whose lines changed and a list of
+        ``{'index', 'pid', 'error'}`` for ops that were skipped.
+        """
+        touched = []
+        errors = []
+        for index, (op, pid, qty) in enumerate(ops):
+            if op == 'add':
+                if pid not in prices:
+                    errors.append({'index': index, 'pid': pid, 'error': 'no_such_product'})
+                    continue
+                self.add(pid, qty, prices[pid])
+            elif pid not in self:
+                errors.append({'index': index, 'pid': pid, 'error': 'not_in_cart'})
+                continue
+            elif op == 'set':
+                self.set(pid, qty, prices.get(pid))
+            else:
+                self.remove(pid, prices.get(pid))
+            if pid not in touched:
+                touched.append(pid)
+        return touched, errors
+
+    def save(self):
+        self.session[SESSION_KEY] = {
+            'items': self.items,
+            'count': self.count,
+            'total': str(self.total) if self.total is not None else None,
+        }
+
+
+def parse_ops(raw):
+    """Validate a batch of ``{'op', 'pid', 'qty'}`` dicts into (op, pid, qty) tuples.
+
+    Raises ValueError describing the first malformed op.
+    """
+    if not isinstance(raw, list):
+        raise ValueError('ops must be a list')
+    if len(raw) > MAX_BATCH_OPS:
+        raise ValueError(f'at most {MAX_BATCH_OPS} ops per batch')
+    ops = []
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict) or item.get('op') not in BATCH_OPS:
+            raise ValueError(f'op {index}: unknown op')
+        try:
+            pid = str(int(item.get('pid')))
+            qty = int(item.get('qty', 1)) if item['op'] != 'remove' else 0
+        except (TypeError, ValueError):
+            raise ValueError(f'op {index}: invalid pid or qty')
+        if item['op'] == 'add' and qty < 1:
+            raise ValueError(f'op {index}: invalid pid or qty')
+        ops.append((item['op'], pid, qty))
+    return ops
+
+
+def load_prices(pids):
+    """Current unit prices for ``pids`` as {pid: Decimal}, in one query."""
+    rows = Product.objects.filter(product_id__in=[int(pid) for pid in pids]).values_list('product_id', 'price')
+    return {str(pid): price for pid, price in rows}
+
+
+async def aload_prices(pids):
+    rows = Product.objects.filter(product_id__in=[int(pid) for pid in pids]).values_list('product_id', 'price')
+    return {str(pid): price async for pid, price in rows}
+
+
+def ensure_total(cart):
+    if cart.total is None:
+        cart.refresh_total(load_prices(cart.items))
+    return cart.total
+
+
+async def aensure_total(cart):
+    if cart.total is None:
+        cart.refresh_total(await aload_prices(cart.items))
+    return cart.total
+
+
+async def aload_cart(session):
+    """``Cart(session)`` for async views.
+
+    Sessions have no async API here, so the first access (the session load,
+    its only I/O before SessionMiddleware saves it) runs in a worker thread;
+    after that the cart is plain in-memory dict work.
+    """
+    return await sync_to_async(Cart)(session)
+
+
+def hydrate(cart, pids=None):
+    """Display lines for the cart (or just ``pids``) and their total, in one query.
+
+    Lines for products that no longer exist are dropped. When the whole cart
+    is hydrated, its running total is re-synced to the current prices.
+    """
+    pids = list(cart.items) if pids is None else [str(pid) for pid in pids if str(pid) in cart]
+    products = Product.objects.only('product_id', 'name', 'price', 'image_url').in_bulk([int(pid) for pid in pids])
+    lines = []
+    total = Decimal('0.00')
+    for pid in pids:
+        product = products.get(int(pid))
+        if product is None:
+            continue
+        qty = cart.items[pid]
+        subtotal = product.price * qty
+        lines.append({'product_id': pid, 'name': product.name, 'qty': qty, 'price': product.price,
+                      'subtotal': subtotal, 'image_url': product.image_url or ''})
+        total += subtotal
+    if len(pids) == len(cart.items) and (total != cart.total or len(lines) != len(pids)):
+        cart.refresh_total({str(p.product_id): p.price for p in products.values()})
+    return lines, total
@@ -0,0 +1,96 @@
+"""Keyset (cursor) pagination over the active catalog.
+
+Every sort mode orders by one column plus ``product_id`` as a tiebreaker, so the
+last row of a page is a unique position. The next page starts strictly after
+that position, which the ``(status, <column>, product_id)`` indexes on
+``Product`` can seek to directly; page 50 costs the same as page 1, unlike an
+OFFSET that has to walk every earlier row.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from .models import Product
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 96
+
+# sort name -> (column, descending)
+SORTS = {
+    'newest': ('created_at', True),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+}
+DEFAULT_SORT = 'newest'
+
+# columns used by templates/partials/product_card.html, and version/updated_at
+# for the page's ETag and the card cache (store/catalog_cache.py)
+CARD_FIELDS = ('product_id', 'name', 'description', 'price', 'image_url', 'version', 'updated_at')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _parse_value(column, raw):
+    if column == 'created_at':
+        return datetime.fromisoformat(raw)
+    return Decimal(raw)
+
+
+def encode_cursor(product, sort):
+    column, _ = SORTS[sort]
+    value = getattr(product, column)
+    raw = value.isoformat() if isinstance(value, datetime) else str(value)
+    payload = json.dumps([raw, product.product_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    column, _ = SORTS[sort]
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw, pid = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _parse_value(column, raw), int(pid)
+    except (ValueError, TypeError, InvalidOperation) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def clean_sort(sort):
+    return sort if sort in SORTS else DEFAULT_SORT
+
+
+def clean_limit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def get_page(sort=DEFAULT_SORT, cursor=None, limit=PAGE_SIZE):
+    """Return ``(products, next_cursor)`` for one page of active products.
+
+    ``next_cursor`` is None on the last page. Raises InvalidCursor if the
+    cursor was not produced by ``encode_cursor`` for the same sort.
+    """
+    column, desc = SORTS[sort]
+    fields = CARD_FIELDS if column in CARD_FIELDS else CARD_FIELDS + (column,)
+    qs = Product.objects.filter(status='ACTIVE').only(*fields)
+    if cursor:
+        value, pid = decode_cursor(cursor, sort)
+        # (column, pk) strictly after the cursor row; the outer bound on the
+        # column alone lets the index range scan start at the cursor.
+        if desc:
+            qs = qs.filter(Q(**{column + '__lte': value}),
+                           Q(**{column + '__lt': value}) | Q(**{column: value, 'product_id__lt': pid}))
+        else:
+            qs = qs.filter(Q(**{column + '__gte': value}),
+                           Q(**{column + '__gt': value}) | Q(**{column: value, 'product_id__gt': pid}))
+    prefix = '-' if desc else ''
+    rows = list(qs.order_by(prefix + column, prefix + 'product_id')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1], sort) if len(rows) > limit else None
+    return rows[:limit], next_cursor
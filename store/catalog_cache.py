@@ -0,0 +1,141 @@
+"""Versioned cache for catalog pages and rendered product fragments.
+
+Nothing here is ever deleted on change. Every cached value embeds the
+version(s) it was built from in its key, so a new version makes the stale
+entries unreachable and the backend's LRU eviction (MAX_ENTRIES for locmem)
+reclaims them. The versions live in the database, where every worker and
+every command sees the same ones even with the per-process locmem cache:
+
+- a product's entries use ``Product.version``, which saves and ``touch()``
+  bump (store/models.py);
+- catalog pages use the 'catalog' CacheVersion row, which
+  ``invalidate_products`` moves on whenever products change. Reading it is
+  one primary-key lookup per page.
+
+The catalog version is a ``time.time_ns()`` value, so together with
+``Product.updated_at`` it tells when something last changed: entries for data
+that changed within DB_REPLICA_MAX_LAG are built from the primary (and cards
+rendered from possibly lagging rows aren't cached), or a replica that hasn't
+caught up could fill the cache with the old data under the new version.
+
+Hit/miss/invalidation counters are kept per process for ``stats()`` and are
+also exported, summed over workers, on /metrics.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import catalog, db_routing, metrics, microcache
+from .models import CacheVersion
+
+CATALOG = 'catalog'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _count(name, n=1):
+    if not n:
+        return
+    with _stats_lock:
+        _stats[name] += n
+    metrics.inc('minishop_catalog_cache_events_total', {'event': name}, n)
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_rate'] = round(snapshot['hits'] / lookups, 4) if lookups else None
+    return snapshot
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _ns(when):
+    return int(when.timestamp() * 1_000_000_000)
+
+
+def catalog_version():
+    version = CacheVersion.objects.filter(name=CATALOG).values_list('version', flat=True).first()
+    if version is None:
+        version = CacheVersion.objects.get_or_create(name=CATALOG, defaults={'version': _new_version()})[0].version
+    return version
+
+
+def invalidate_products(pids):
+    """Move the catalog listing to a new version; the products' own versions
+    were bumped by whoever changed them (save or ``touch()``).
+
+    nginx's copies of the pages are refreshed too (store/microcache.py).
+    """
+    pids = list(pids)
+    # never backwards, even from a process whose clock is behind
+    if not CacheVersion.objects.filter(name=CATALOG).update(version=Greatest(F('version') + 1, _new_version())):
+        CacheVersion.objects.get_or_create(name=CATALOG, defaults={'version': _new_version()})
+    _count('invalidations', len(pids))
+    microcache.changed(pids)
+
+
+def _get_or_build(key, version, build):
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    if db_routing.lagging(version):
+        with db_routing.use_primary():
+            value = build()
+    else:
+        value = build()
+    cache.set(key, value)
+    return value
+
+
+def get_catalog_page(sort, cursor, limit):
+    """Cached ``catalog.get_page``; raises catalog.InvalidCursor like it does."""
+    version = catalog_version()
+    key = f'catalog:page:{version}:{sort}:{cursor or ""}:{limit}'
+    return _get_or_build(key, version, lambda: catalog.get_page(sort, cursor, limit))
+
+
+def render_cards(products):
+    """Rendered product cards for ``products``, in order, from one multi-get."""
+    keys = {p.product_id: f'card:{p.product_id}:{p.version}' for p in products}
+    cached = cache.get_many(list(keys.values()))
+    _count('hits', len(cached))
+    _count('misses', len(keys) - len(cached))
+    fresh = {}
+    cards = []
+    for p in products:
+        key = keys[p.product_id]
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string('partials/product_card.html', {'p': p})
+            if not db_routing.lagging(_ns(p.updated_at)):
+                fresh[key] = html
+        cards.append(mark_safe(html))
+    if fresh:
+        cache.set_many(fresh)
+    return cards
+
+
+def get_product_detail(pid, version, updated_at, load):
+    """Rendered detail fragment for product ``pid`` at ``version`` (last changed at ``updated_at``).
+
+    ``version`` must change with every product rendered into the fragment,
+    the related ones included.
+
+    ``load()`` returns the fragment's template context and is only called on
+    a miss; it may raise Http404, which is not cached.
+    """
+    key = f'detail:{pid}:{version}'
+    html = _get_or_build(key, _ns(updated_at), lambda: render_to_string('partials/product_detail_body.html', load()))
+    return mark_safe(html)
@@ -0,0 +1,105 @@
+"""Read replicas for catalog and order-confirmation reads.
+
+Every read goes to the primary ('default') unless the view opts in with
+``@replica_reads``. In such a view, reads of REPLICA_MODELS go to one replica
+per request, picked at random from DATABASE_REPLICAS, except:
+
+- inside a transaction on the primary;
+- after the request has written something (sessions aside);
+- in ``use_primary()`` blocks;
+- for a browser that wrote through the site before. The first request that
+  writes sets PIN_COOKIE (a browser-session cookie), and its reads stay on
+  the primary from then on, so a buyer sees their own order and stock changes
+  however far the replicas lag.
+
+ReplicaRoutingMiddleware keeps track of the writes. With no replicas
+configured the middleware and ``@replica_reads`` do nothing.
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary'
+REPLICA_MODELS = {'store.Product', 'store.Order', 'store.OrderItem'}
+# writes that don't pin a browser to the primary: every request with a cart saves its session
+UNTRACKED_WRITES = {'sessions.Session'}
+
+request_state = contextvars.ContextVar('db_routing', default=None)
+
+
+class RequestRouting:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = None  # set by @replica_reads for the duration of the view
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def replica_reads(view):
+    """Let ``view`` read REPLICA_MODELS from a replica (sync views)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = request_state.get()
+        if state is None or not replicas() or PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        state.replica = random.choice(replicas())
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica = None
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, even in a ``@replica_reads`` view."""
+    state = request_state.get()
+    saved = state.replica if state else None
+    if state:
+        state.replica = None
+    try:
+        yield
+    finally:
+        if state:
+            state.replica = saved
+
+
+def lagging(version_ns):
+    """Whether data changed at ``version_ns`` (time.time_ns()) may not be on the replicas yet."""
+    max_lag = getattr(settings, 'DB_REPLICA_MAX_LAG', 5)
+    return bool(replicas()) and time.time_ns() - version_ns < max_lag * 1_000_000_000
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = request_state.get()
+        if (state is None or state.replica is None or state.wrote
+                or model._meta.label not in REPLICA_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            # explicit, or Django would follow a replica-loaded instance's database
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None and model._meta.label not in UNTRACKED_WRITES:
+            state.wrote = True
+        # explicit, or saving an instance read from a replica would write to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        return db not in replicas()
@@ -0,0 +1,35 @@
+"""Outbox handlers for store events (run by run_outbox_worker, not in requests)."""
+from django.core.mail import send_mail
+
+from . import images, microcache, outbox, rollups
+from .models import Order
+
+
+@outbox.handler('order.placed')
+def send_order_confirmation(payload):
+    order = Order.objects.prefetch_related('items__product').filter(pk=payload['order_id']).first()
+    if order is None:
+        return  # deleted since; nothing to confirm
+    lines = [f'{item.product.name} x{item.quantity}: ${item.subtotal}' for item in order.items.all()]
+    send_mail(
+        f'Your MiniShop order #{order.order_id}',
+        f'Hi {order.customer_name},\n\nThanks for your order.\n\n' + '\n'.join(lines)
+        + f'\n\nTotal: ${order.total_amount}\nShipping to: {order.shipping_address}\n',
+        None,
+        [order.customer_email],
+    )
+
+
+@outbox.handler('order.placed')
+def update_sales_rollups(payload):
+    rollups.add_orders([payload['order_id']])
+
+
+@outbox.handler('catalog.changed')
+def refresh_microcache(payload):
+    microcache.purge(payload['pids'], payload.get('catalog', True))
+
+
+@outbox.handler('product.image_changed')
+def build_image_derivatives(payload):
+    images.build(payload['url'], payload['pids'])
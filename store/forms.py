@@ -2,6 +2,10 @@ from django import forms
 from .models import Product
 
 class ProductForm(forms.ModelForm):
+    # the stock shown when the form was opened: saving applies the change from
+    # it, so checkouts in the meantime aren't undone (see Product.save)
+    stock_loaded = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Product
         fields = ['name', 'description', 'price', 'stock', 'image_url', 'status']
@@ -9,3 +13,14 @@ class ProductForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows':3}),
             'status': forms.Select(choices=[('ACTIVE','ACTIVE'), ('INACTIVE','INACTIVE')])
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.fields['stock_loaded'].initial = self.instance.stock
+
+    def _post_clean(self):
+        super()._post_clean()
+        loaded = self.cleaned_data.get('stock_loaded')
+        if self.instance.pk is not None and loaded is not None:
+            self.instance._loaded_stock = loaded
@@ -0,0 +1,180 @@
+"""Resized WebP/JPEG derivatives of product images.
+
+Derivatives are written under ``MEDIA_ROOT/products/<source key>/`` with the
+content hash in the file name, so nginx can serve them with a one-year
+immutable Cache-Control. ``MEDIA_ROOT/products/manifest.json`` maps each
+source image URL to its derivatives; templates read it through the
+``product_images`` tags and fall back to the original URL until an image has
+been processed.
+
+Generation never runs in a request: the build_image_derivatives command
+processes images in a process pool, and product saves queue new image URLs
+for run_outbox_worker (IMAGE_DERIVATIVES_ON_SAVE).
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+WIDTHS = (160, 320, 640, 960)
+FORMATS = ('webp', 'jpeg')
+QUALITY = {'webp': 80, 'jpeg': 82}
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 15
+SUBDIR = 'products'
+
+_manifest_cache = {'mtime': None, 'data': {}}
+_manifest_lock = threading.Lock()
+
+
+def manifest_path(media_root=None):
+    return Path(media_root or settings.MEDIA_ROOT) / SUBDIR / 'manifest.json'
+
+
+def source_key(url):
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def _read_source(url, media_root, media_url):
+    if url.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as resp:
+            data = resp.read(MAX_SOURCE_BYTES + 1)
+    elif media_url and url.startswith(media_url):
+        path = (Path(media_root) / url[len(media_url):]).resolve()
+        if Path(media_root).resolve() not in path.parents:
+            raise ValueError(f'{url} is outside MEDIA_ROOT')
+        data = path.read_bytes()
+    else:
+        raise ValueError(f'unsupported image URL {url!r}')
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError(f'{url} is larger than {MAX_SOURCE_BYTES} bytes')
+    return data
+
+
+def render_derivatives(url, media_root, media_url):
+    """Fetch one source image and write its derivatives; returns the manifest entry.
+
+    Pure Pillow and file I/O with everything passed in, so it can run in a
+    worker process without Django.
+    """
+    from PIL import Image, ImageOps
+
+    original = Image.open(io.BytesIO(_read_source(url, media_root, media_url)))
+    original = ImageOps.exif_transpose(original)
+    width, height = original.size
+    widths = [w for w in WIDTHS if w < width] + [min(width, WIDTHS[-1])]
+    key = source_key(url)
+    out_dir = Path(media_root) / SUBDIR / key
+    out_dir.mkdir(parents=True, exist_ok=True)
+    entry = {'width': width, 'height': height, 'webp': {}, 'jpeg': {}}
+    for w in sorted(set(widths)):
+        resized = original.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+        for fmt in FORMATS:
+            image = resized
+            if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            buf = io.BytesIO()
+            image.save(buf, fmt.upper(), quality=QUALITY[fmt], optimize=True)
+            data = buf.getvalue()
+            digest = hashlib.sha1(data).hexdigest()[:12]
+            name = f'{w}w.{digest}.{"jpg" if fmt == "jpeg" else fmt}'
+            path = out_dir / name
+            if not path.exists():
+                tmp = path.with_suffix(path.suffix + '.tmp')
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            entry[fmt][str(w)] = f'{SUBDIR}/{key}/{name}'
+    return entry
+
+
+@contextmanager
+def _locked_manifest(media_root=None):
+    """Read-modify-write the manifest under an exclusive file lock."""
+    path = manifest_path(media_root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix('.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            data = json.loads(path.read_text()) if path.exists() else {}
+        except ValueError:
+            data = {}
+        yield data
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(data, separators=(',', ':'), sort_keys=True))
+        os.replace(tmp, path)
+
+
+def save_entries(entries, media_root=None):
+    """Merge ``{url: entry}`` into the manifest."""
+    with _locked_manifest(media_root) as data:
+        data.update(entries)
+
+
+def get_manifest():
+    """The manifest, re-read only when the file changed."""
+    path = manifest_path()
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return {}
+    with _manifest_lock:
+        if _manifest_cache['mtime'] != mtime:
+            try:
+                _manifest_cache['data'] = json.loads(path.read_text())
+            except (OSError, ValueError):
+                return _manifest_cache['data']
+            _manifest_cache['mtime'] = mtime
+        return _manifest_cache['data']
+
+
+def srcset(url, fmt):
+    entry = get_manifest().get(url) if url else None
+    if not entry:
+        return None
+    return ', '.join(f'{settings.MEDIA_URL}{name} {w}w' for w, name in sorted(entry[fmt].items(), key=lambda i: int(i[0])))
+
+
+def smallest(url, min_width=0):
+    """URL of the smallest JPEG derivative at least ``min_width`` wide, or the original."""
+    entry = get_manifest().get(url) if url else None
+    if not entry:
+        return url
+    widths = sorted(int(w) for w in entry['jpeg'])
+    width = next((w for w in widths if w >= min_width), widths[-1])
+    return settings.MEDIA_URL + entry['jpeg'][str(width)]
+
+
+def schedule(url, pids):
+    """Queue derivatives of ``url`` for the outbox worker, which then refreshes
+    the cached fragments of ``pids``. Call inside the transaction that saves them."""
+    if not url or url in get_manifest() or not getattr(settings, 'IMAGE_DERIVATIVES_ON_SAVE', True):
+        return
+    from . import outbox
+    outbox.emit('product.image_changed', {'url': url, 'pids': list(pids)})
+
+
+def build(url, pids):
+    """Generate the derivatives of ``url`` (unless the manifest has them) and
+    refresh the cached fragments of ``pids``, whose markup (srcset) changes."""
+    from .catalog_cache import invalidate_products
+    from .models import Product
+
+    if url in get_manifest():
+        return
+    save_entries({url: render_derivatives(url, str(settings.MEDIA_ROOT), settings.MEDIA_URL)})
+    Product.objects.filter(pk__in=pids).touch()
+    invalidate_products(pids)
@@ -0,0 +1,88 @@
+import json
+import os
+import random
+from contextlib import ExitStack, contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import bench
+from store.models import Product
+
+SERVERS = {
+    'wsgi': ['minishop.wsgi:application'],
+    'asgi': ['minishop.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+@contextmanager
+def _server(mode, workers):
+    """Run gunicorn for ``mode`` on a free local port; yields its base URL."""
+    env = {}
+    if mode == 'asgi' and not os.environ.get('DB_CONN_MAX_AGE'):
+        env['DB_CONN_MAX_AGE'] = '0'  # as compose/gunicorn.conf.py deploys uvicorn workers
+    try:
+        with bench.spawn([*SERVERS[mode], '--workers', str(workers)], env) as (url, _):
+            yield url
+    except bench.ServerError as exc:
+        raise CommandError(f'{mode} server: {exc}')
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the cart AJAX endpoints (summary, add, update) under concurrency, '
+            'side by side for WSGI and ASGI deployments.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', metavar='URL', help='base URL of a running WSGI server')
+        parser.add_argument('--asgi', metavar='URL', help='base URL of a running ASGI server')
+        parser.add_argument('--spawn', action='store_true',
+                            help='start gunicorn sync and uvicorn-worker servers locally with the current settings')
+        parser.add_argument('--workers', type=int, default=3, help='workers per spawned server (default 3)')
+        parser.add_argument('--concurrency', default='1,16,64', help='comma-separated client counts')
+        parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+        parser.add_argument('--warmup', type=float, default=2.0, help='uncounted seconds at the start of each run')
+        parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+
+    def handle(self, *args, **opts):
+        pids = list(Product.objects.filter(status='ACTIVE').order_by('?').values_list('product_id', flat=True)[:200])
+        if not pids:
+            raise CommandError('no active products to add to carts')
+        levels = [int(c) for c in opts['concurrency'].split(',')]
+
+        def setup(user):
+            user.request('add', 'POST', f'/cart/add_ajax/{random.choice(pids)}/', {'quantity': 1})
+
+        def scenario(user):
+            pid = random.choice(pids)
+            user.request('summary', 'GET', '/cart/summary_ajax/')
+            user.request('add', 'POST', f'/cart/add_ajax/{pid}/', {'quantity': 1})
+            user.request('update', 'POST', '/cart/update_ajax/', {'pid': pid, 'quantity': random.randint(1, 3)})
+
+        results = {}
+        with ExitStack() as stack:
+            targets = {mode: opts[mode] for mode in SERVERS if opts[mode]}
+            if opts['spawn']:
+                for mode in SERVERS:
+                    targets.setdefault(mode, stack.enter_context(_server(mode, opts['workers'])))
+            if not targets:
+                raise CommandError('give --wsgi and/or --asgi URLs, or --spawn')
+            for concurrency in levels:
+                for mode, url in targets.items():
+                    stats = bench.run(url.rstrip('/'), scenario, concurrency, opts['duration'],
+                                      setup=setup, warmup=opts['warmup'])
+                    results.setdefault(mode, {})[concurrency] = stats
+                    self.stdout.write(f'{mode} c={concurrency}: ' + ', '.join(
+                        f'{label} {s["rps"]}/s p99 {s["p99_ms"]}ms' + (f' ({s["errors"]} errors)' if s['errors'] else '')
+                        for label, s in stats.items()))
+
+        self.stdout.write('')
+        self.stdout.write(f'{"endpoint":<10}{"clients":>8}' + ''.join(f'{m + " req/s":>13}{m + " p99":>12}' for m in results))
+        for concurrency in levels:
+            for label in ('summary', 'add', 'update', 'all'):
+                row = f'{label:<10}{concurrency:>8}'
+                for mode in results:
+                    s = results[mode][concurrency].get(label, {})
+                    row += f'{s.get("rps", 0):>13}{str(s.get("p99_ms", 0)) + "ms":>12}'
+                self.stdout.write(row)
+        if opts['json']:
+            with open(opts['json'], 'w') as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,242 @@
+import json
+import platform
+import random
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from store import bench, search
+from store.models import Order, OrderItem, Product
+
+CONFIG = Path(settings.BASE_DIR) / 'compose' / 'gunicorn.conf.py'
+FLOWS = ('home', 'product', 'add_to_cart', 'update_cart', 'checkout_prepare', 'checkout')
+CUSTOMER = {'name': 'bench', 'email': 'bench@example.com', 'phone': '0', 'address': '-'}
+WORDS = (
+    'running trail road shoe sneaker trainer sock jacket shirt shorts tight cap bottle bag vest '
+    'rain wind light cushioned grippy waterproof red blue black white green classic pro tempo'
+).split()
+# a p95 has to grow by more than the tolerance and by more than this to count
+# as a regression, so sub-millisecond jitter doesn't fail a run
+MIN_DELTA_MS = 2.0
+
+
+def journey(user, rng, pids):
+    """One buyer: the catalog, a product, the cart, then checkout."""
+    pid = rng.choice(pids)
+    user.request('home', 'GET', '/')
+    user.request('product', 'GET', f'/product/{pid}/')
+    user.request('add_to_cart', 'POST', f'/cart/add_ajax/{pid}/', {'quantity': 1})
+    user.request('update_cart', 'POST', '/cart/update_ajax/', {'pid': pid, 'quantity': 2})
+    user.request('checkout_prepare', 'POST', '/cart/checkout_prepare/', {'selected': pid})
+    user.request('checkout', 'POST', '/checkout/', CUSTOMER)
+
+
+class ClientUser:
+    """bench.User's interface over the Django test client, counting queries per request."""
+
+    def __init__(self):
+        self.client = Client()
+        self.samples = []  # (label, seconds, ok, queries)
+
+    def request(self, label, method, path, data=None):
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            start = time.perf_counter()
+            response = getattr(self.client, method.lower())(path, data or {})
+            seconds = time.perf_counter() - start
+        ok = 200 <= response.status_code < 400
+        if label == 'checkout_prepare':
+            ok = ok and response.json().get('success')
+        elif label == 'checkout':
+            ok = ok and response.get('Location', '').startswith('/order/')
+        self.samples.append((label, seconds, ok, sum(len(c) for c in captured)))
+        return response.status_code, response.content
+
+
+def client_stats(samples):
+    """Per-flow stats of a serial run: throughput is requests per second of that flow's own time."""
+    by_label = {}
+    for label, seconds, ok, queries in samples:
+        by_label.setdefault(label, []).append((seconds, ok, queries))
+    by_label['all'] = [s[1:] for s in samples]
+    result = {}
+    for label, values in by_label.items():
+        latencies = sorted(seconds * 1000 for seconds, _, _ in values)
+        result[label] = {
+            'requests': len(values),
+            'errors': sum(1 for _, ok, _ in values if not ok),
+            'rps': round(len(values) / (sum(latencies) / 1000), 1),
+            'p50_ms': round(bench.percentile(latencies, 50), 2),
+            'p95_ms': round(bench.percentile(latencies, 95), 2),
+            'p99_ms': round(bench.percentile(latencies, 99), 2),
+            'queries': round(sum(q for _, _, q in values) / len(values), 2),
+        }
+    return result
+
+
+def regressions(results, baseline, tolerance):
+    """What got slower than ``baseline``, or issues more queries per request."""
+    found = []
+    for mode in ('client', 'http'):
+        for flow, old in baseline.get(mode, {}).items():
+            new = results.get(mode, {}).get(flow)
+            if new is None:
+                continue
+            if new['p95_ms'] > old['p95_ms'] * (1 + tolerance) and new['p95_ms'] - old['p95_ms'] > MIN_DELTA_MS:
+                found.append(f'{mode} {flow}: p95 {old["p95_ms"]}ms -> {new["p95_ms"]}ms')
+            if new['rps'] < old['rps'] * (1 - tolerance):
+                found.append(f'{mode} {flow}: throughput {old["rps"]}/s -> {new["rps"]}/s')
+            if 'queries' in old and new['queries'] > old['queries'] + 0.01:
+                found.append(f'{mode} {flow}: queries per request {old["queries"]} -> {new["queries"]}')
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Seed a scratch SQLite database and benchmark the shopping flows (home, product, cart, '
+            'checkout): throughput, p50/p95/p99 latency and queries per request, through the test '
+            'client and optionally over HTTP. Fails when a run regresses against --baseline. '
+            'Point DATABASE_URL at a scratch file, e.g. sqlite:////tmp/bench.sqlite3?timeout=30: '
+            'seeding replaces its contents. SQLite takes its write lock when a transaction first '
+            'writes, so concurrent checkouts over HTTP can fail with "database is locked"; on '
+            'Django 5.1+ add &transaction_mode=IMMEDIATE to the URL. With DEBUG off, pages link '
+            'static files through the collectstatic manifest: run collectstatic (or prepare_startup) '
+            'for STATIC_ROOT first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--reuse', action='store_true', help='keep the data (and the orders earlier runs placed) if it was seeded with the same options')
+        parser.add_argument('--iterations', type=int, default=200, help='journeys through the test client')
+        parser.add_argument('--http', metavar='URL', help='also load a running server at URL (using this database)')
+        parser.add_argument('--spawn', action='store_true', help='also load a gunicorn started with compose/gunicorn.conf.py')
+        parser.add_argument('--workers', type=int, default=3, help='workers of the spawned server')
+        parser.add_argument('--concurrency', type=int, default=8, help='concurrent buyers over HTTP')
+        parser.add_argument('--duration', type=float, default=10.0, help='seconds of HTTP load')
+        parser.add_argument('--json', metavar='PATH', help='write the results as JSON')
+        parser.add_argument('--baseline', metavar='PATH', help='results JSON to compare against')
+        parser.add_argument('--update-baseline', action='store_true', help='write the results to --baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='allowed slowdown in p95 latency and throughput (default 0.5); '
+                                 'queries per request may not grow at all')
+
+    def handle(self, *args, **opts):
+        db = connection.settings_dict
+        if db['ENGINE'] != 'django.db.backends.sqlite3' or db['NAME'] == ':memory:':
+            raise CommandError('bench_flows seeds a SQLite file: set DATABASE_URL=sqlite:////tmp/bench.sqlite3')
+        manifest = getattr(staticfiles_storage, 'manifest_name', None)
+        if manifest and not settings.DEBUG and not staticfiles_storage.exists(manifest):
+            # every page would fail with "Missing staticfiles manifest entry"
+            raise CommandError(f'no static files manifest in {settings.STATIC_ROOT}: run collectstatic first')
+        meta = {'products': opts['products'], 'orders': opts['orders'], 'seed': opts['seed']}
+        self._seed(Path(db['NAME']), meta, opts['reuse'])
+        meta.update(iterations=opts['iterations'], concurrency=opts['concurrency'],
+                    python=platform.python_version(), django=django.get_version())
+        results = {'meta': meta}
+
+        pids = [str(pid) for pid in Product.objects.filter(status='ACTIVE').order_by('pk').values_list('pk', flat=True)]
+        rng = random.Random(opts['seed'])
+        user = ClientUser()
+        for _ in range(5):  # uncounted: fills the caches and compiles the templates
+            journey(user, rng, pids)
+        user.samples.clear()
+        for _ in range(opts['iterations']):
+            journey(user, rng, pids)
+        results['client'] = client_stats(user.samples)
+        self._report('test client', results['client'])
+        if results['client']['all']['errors']:
+            raise CommandError('some requests failed; see the errors column')
+
+        if opts['http'] or opts['spawn']:
+            with ExitStack() as stack:
+                url = opts['http']
+                if not url:
+                    try:
+                        url, _ = stack.enter_context(bench.spawn(['-c', str(CONFIG)], {'WEB_CONCURRENCY': str(opts['workers'])}))
+                    except bench.ServerError as exc:
+                        raise CommandError(f'server: {exc}')
+                # concurrent buyers interleave differently on every run anyway
+                results['http'] = bench.run(url.rstrip('/'), lambda http_user: journey(http_user, random, pids),
+                                            opts['concurrency'], opts['duration'], warmup=1.0)
+            self._report(f'HTTP, {opts["concurrency"]} buyers', results['http'])
+
+        if opts['json']:
+            Path(opts['json']).write_text(json.dumps(results, indent=2))
+        if not opts['baseline']:
+            return
+        path = Path(opts['baseline'])
+        if opts['update_baseline'] or not path.exists():
+            path.write_text(json.dumps(results, indent=2))
+            self.stdout.write(f'Baseline written to {path}')
+            return
+        baseline = json.loads(path.read_text())
+        for key in ('products', 'orders', 'seed', 'concurrency'):
+            if baseline['meta'].get(key) != meta[key]:
+                raise CommandError(f'the baseline was recorded with {key}={baseline["meta"].get(key)}, this run used {meta[key]}')
+        found = regressions(results, baseline, opts['tolerance'])
+        if found:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(found))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
+
+    def _seed(self, path, meta, reuse):
+        stamp = path.with_name(path.name + '.bench.json')
+        previous = json.loads(stamp.read_text()) if stamp.exists() else None
+        call_command('migrate', verbosity=0)
+        if previous is None and Product.objects.exists():
+            raise CommandError(f'{path} has data but was not seeded by bench_flows; use a scratch file')
+        if reuse and previous == meta:
+            return
+        started = time.perf_counter()
+        call_command('flush', interactive=False, verbosity=0)
+        rng = random.Random(meta['seed'])
+        with transaction.atomic():
+            products = Product.objects.bulk_create([
+                Product(name=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title() + f' {i}',
+                        description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+                        price=Decimal(rng.randint(500, 20000)) / 100,
+                        stock=1_000_000,  # checkouts never run out
+                        status='ACTIVE' if rng.random() < 0.95 else 'INACTIVE')
+                for i in range(meta['products'])
+            ], batch_size=1000)
+        prices = {p.pk: p.price for p in products}
+        pids = list(prices)
+        for start in range(0, meta['orders'], 5000):
+            with transaction.atomic():
+                baskets = [rng.sample(pids, min(len(pids), rng.randint(1, 4)))
+                           for _ in range(min(5000, meta['orders'] - start))]
+                orders = Order.objects.bulk_create([
+                    Order(customer_name='seed', customer_email='seed@example.com', customer_phone='0',
+                          shipping_address='-', total_amount=sum(prices[pid] for pid in basket), rolled_up=True)
+                    for basket in baskets
+                ], batch_size=1000)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product_id=pid, quantity=1, unit_price=prices[pid], subtotal=prices[pid])
+                    for order, basket in zip(orders, baskets) for pid in basket
+                ], batch_size=1000)
+        # the rows were written around the signals that keep these fresh
+        cache.clear()
+        search.mark_stale()
+        stamp.write_text(json.dumps(meta))
+        self.stdout.write(f'Seeded {meta["products"]} products and {meta["orders"]} orders '
+                          f'in {time.perf_counter() - started:.1f}s')
+
+    def _report(self, title, stats):
+        self.stdout.write(f'\n{title}')
+        self.stdout.write(f'{"flow":<18}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+                          f'{"p99 ms":>9}{"queries":>9}')
+        for label in (*FLOWS, 'all'):
+            s = stats.get(label)
+            if s:
+                self.stdout.write(f'{label:<18}{s["requests"]:>9}{s["errors"]:>8}{s["rps"]:>9}{s["p50_ms"]:>9}'
+                                  f'{s["p95_ms"]:>9}{s["p99_ms"]:>9}{s.get("queries", "-"):>9}')
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+from store.recommendations import cooccurrence, np, resize, top_k
+
+
+def make_baskets(rng, orders, products, mean_items):
+    """Parallel (order id, product id) arrays; popularity falls off like a Zipf curve."""
+    sizes = 1 + rng.poisson(mean_items - 1, orders)
+    order_ids = np.repeat(np.arange(1, orders + 1), sizes)
+    weights = 1.0 / np.arange(1, products + 1) ** 0.8
+    product_ids = 1 + rng.choice(products, size=len(order_ids), p=weights / weights.sum())
+    return order_ids, product_ids
+
+
+class Command(BaseCommand):
+    help = ('Benchmark building the co-purchase matrix and top-K table against synthetic order '
+            'histories of increasing size, plus an incremental refresh with 1%% more orders (no database).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', default='10000,100000,1000000', help='comma-separated order counts')
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--mean-items', type=float, default=3.0, help='average items per order')
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        if np is None or recommendations.sparse is None:
+            raise CommandError('Needs numpy and scipy')
+        n = opts['products'] + 1
+        self.stdout.write(f"{'orders':>9} {'items':>9} {'pairs':>10} {'matrix s':>9} {'top-k s':>8} "
+                          f"{'total s':>8} {'+1% s':>7}")
+        for orders in [int(o) for o in opts['orders'].split(',') if o]:
+            rng = np.random.default_rng(opts['seed'])
+            order_ids, product_ids = make_baskets(rng, orders, opts['products'], opts['mean_items'])
+
+            t0 = time.perf_counter()
+            matrix = cooccurrence(order_ids, product_ids, n)
+            t1 = time.perf_counter()
+            top_k(matrix, np.unique(matrix.nonzero()[0]), opts['top_k'])
+            t2 = time.perf_counter()
+
+            # what a refresh does with the next 1% of orders
+            new_orders, new_products = make_baskets(rng, max(orders // 100, 1), opts['products'], opts['mean_items'])
+            t3 = time.perf_counter()
+            delta = cooccurrence(new_orders, new_products, n)
+            updated = resize(matrix, n) + delta
+            top_k(updated, np.unique(delta.nonzero()[0]), opts['top_k'])
+            t4 = time.perf_counter()
+
+            self.stdout.write(f'{orders:>9} {len(order_ids):>9} {matrix.nnz:>10} {t1 - t0:>9.2f} {t2 - t1:>8.2f} '
+                              f'{t2 - t0:>8.2f} {t4 - t3:>7.2f}')
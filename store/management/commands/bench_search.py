@@ -0,0 +1,68 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.search import SearchIndex
+
+WORDS = (
+    'running trail road shoe shoes sneaker trainer sock socks jacket shirt short shorts tight '
+    'cap hat bottle bag vest rain wind light lightweight cushioned grippy breathable waterproof '
+    'red blue black white green orange grey pink yellow men women kids classic pro elite tempo '
+    'marathon sprint recovery carbon foam mesh wool cotton reflective thermal compression'
+).split()
+
+
+def make_doc(rng):
+    name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+    # a unique model code per product keeps the vocabulary growing with the catalog
+    return f'{name} {rng.randrange(16 ** 6):06x}', description
+
+
+def make_query(rng, kind):
+    word = rng.choice(WORDS)
+    if kind == 'prefix':
+        return word[:max(2, len(word) - 3)]
+    if kind == 'typo' and len(word) > 4:
+        i = rng.randrange(1, len(word) - 1)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == 'multi':
+        return f'{word} {rng.choice(WORDS)}'
+    return word
+
+
+class Command(BaseCommand):
+    help = 'Benchmark product search query latency against synthetic catalogs of increasing size (no database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,50000,100000', help='comma-separated catalog sizes')
+        parser.add_argument('--queries', type=int, default=500, help='queries per catalog size')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **opts):
+        sizes = [int(s) for s in opts['sizes'].split(',') if s]
+        kinds = ('exact', 'prefix', 'typo', 'multi')
+        self.stdout.write(f"{'products':>9} {'terms':>8} {'build s':>8} " + ' '.join(f'{k + " p50/p95 ms":>22}' for k in kinds))
+        for size in sizes:
+            rng = random.Random(opts['seed'])
+            index = SearchIndex()
+            t0 = time.perf_counter()
+            for pid in range(1, size + 1):
+                index.add(pid, *make_doc(rng))
+            build = time.perf_counter() - t0
+            index.search('warmup')  # sorts the vocabulary once
+            cells = []
+            for kind in kinds:
+                timings = []
+                for _ in range(opts['queries']):
+                    query = make_query(rng, kind)
+                    t0 = time.perf_counter()
+                    index.search(query, limit=20)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                timings.sort()
+                p50 = statistics.median(timings)
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                cells.append(f'{p50:>10.3f}/{p95:<11.3f}')
+            self.stdout.write(f'{size:>9} {len(index.postings):>8} {build:>8.2f} ' + ' '.join(cells))
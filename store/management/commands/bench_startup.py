@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import statistics
+import threading
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import bench
+from store.models import Product
+
+CONFIG = Path(settings.BASE_DIR) / 'compose' / 'gunicorn.conf.py'
+APPS = {'sync': 'minishop.wsgi:application', 'gthread': 'minishop.wsgi:application',
+        'uvicorn': 'minishop.asgi:application'}
+WORKER_CLASSES = {'sync': 'sync', 'gthread': 'gthread', 'uvicorn': 'uvicorn.workers.UvicornWorker'}
+
+
+def search_path(name):
+    """The search page for the first word of a product name."""
+    return '/search/?' + urlencode({'q': (name.split() or [''])[0]})
+
+
+def first_requests(url, paths, clients):
+    """Latency (ms) of the first request to each path from ``clients`` new connections at once."""
+    result = {}
+    for path in paths:
+        users = [bench.User(url) for _ in range(clients)]
+        threads = [threading.Thread(target=user.request, args=(path, 'GET', path)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencies = [seconds * 1000 for user in users for _, seconds, ok, _ in user.samples]
+        for user in users:
+            user.close()
+        result[path] = latencies
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn as before (plain command line) and with compose/gunicorn.conf.py '
+            '(preload + warm-up), and compare time to first request and steady-state throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3, help='workers per server (default 3)')
+        parser.add_argument('--worker-class', choices=sorted(WORKER_CLASSES), default='sync')
+        parser.add_argument('--rounds', type=int, default=3, help='server starts per variant (default 3)')
+        parser.add_argument('--concurrency', type=int, default=16, help='clients for the steady-state run')
+        parser.add_argument('--duration', type=float, default=10.0, help='seconds of steady-state load')
+        parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+
+    def handle(self, *args, **opts):
+        products = list(Product.objects.filter(status='ACTIVE').order_by('?').values_list('product_id', 'name')[:50])
+        if not products:
+            raise CommandError('no active products to browse')
+        paths = ['/', f'/product/{products[0][0]}/', search_path(products[0][1]), '/cart/']
+        workers, kind = opts['workers'], opts['worker_class']
+        # the tuned config defaults uvicorn workers to DB_CONN_MAX_AGE=0; so did the old entrypoint
+        plain_env = {'DB_CONN_MAX_AGE': '0'} if kind == 'uvicorn' and not os.environ.get('DB_CONN_MAX_AGE') else {}
+        variants = {
+            'baseline': ([APPS[kind], '--workers', str(workers), '--worker-class', WORKER_CLASSES[kind]], plain_env),
+            'tuned': (['-c', str(CONFIG)], {'WEB_CONCURRENCY': str(workers), 'GUNICORN_WORKER_CLASS': kind}),
+        }
+
+        def scenario(user):
+            pid, name = random.choice(products)
+            user.request('home', 'GET', '/')
+            user.request('product', 'GET', f'/product/{pid}/')
+            user.request('search', 'GET', search_path(name))
+
+        results = {}
+        for variant, (args, env) in variants.items():
+            boots, firsts = [], {path: [] for path in paths}
+            for _ in range(opts['rounds']):
+                try:
+                    with bench.spawn(args, env) as (url, boot):
+                        boots.append(boot)
+                        for path, latencies in first_requests(url, paths, workers).items():
+                            firsts[path].extend(latencies)
+                except bench.ServerError as exc:
+                    raise CommandError(f'{variant} server: {exc}')
+            with bench.spawn(args, env) as (url, _):
+                steady = bench.run(url, scenario, opts['concurrency'], opts['duration'], warmup=1.0)
+            results[variant] = {
+                'boot_s': round(statistics.median(boots), 3),
+                'first_request_ms': {path: {'p50': round(statistics.median(v), 1), 'max': round(max(v), 1)}
+                                     for path, v in firsts.items()},
+                'steady': steady,
+            }
+
+        self.stdout.write(f'{workers} {kind} workers, {opts["rounds"]} starts per variant')
+        self.stdout.write(f'{"":<28}' + ''.join(f'{v:>20}' for v in results))
+        self.stdout.write(f'{"boot until first 200 (s)":<28}' + ''.join(f'{r["boot_s"]:>20}' for r in results.values()))
+        for path in paths:
+            self.stdout.write(f'{"first " + path[:22]:<28}' + ''.join(
+                f'{"%s / %s ms" % (r["first_request_ms"][path]["p50"], r["first_request_ms"][path]["max"]):>20}'
+                for r in results.values()))
+        for label in ('home', 'product', 'search', 'all'):
+            self.stdout.write(f'{"steady " + label + " req/s, p99":<28}' + ''.join(
+                f'{"%s, %sms" % (r["steady"][label]["rps"], r["steady"][label]["p99_ms"]):>20}'
+                for r in results.values()))
+        if opts['json']:
+            with open(opts['json'], 'w') as f:
+                json.dump(results, f, indent=2)
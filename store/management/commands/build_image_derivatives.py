@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.catalog_cache import invalidate_products
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Generate resized WebP/JPEG derivatives of product images under MEDIA_ROOT '
+            'using a process pool, and record them in the image manifest.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='processes (default: CPU count)')
+        parser.add_argument('--all', action='store_true', help='rebuild images that already have derivatives')
+        parser.add_argument('--product', type=int, action='append', help='only this product id (repeatable)')
+
+    def handle(self, *args, **opts):
+        qs = Product.objects.exclude(image_url='').values_list('product_id', 'image_url')
+        if opts['product']:
+            qs = qs.filter(product_id__in=opts['product'])
+        by_url = {}
+        for pid, url in qs.iterator():
+            by_url.setdefault(url.strip(), []).append(pid)
+        done = images.get_manifest()
+        todo = [url for url in by_url if opts['all'] or url not in done]
+        self.stdout.write(f'{len(todo)} image(s) to process ({len(by_url) - len(todo)} already done)')
+
+        started = time.perf_counter()
+        entries = {}
+        failed = 0
+        with ProcessPoolExecutor(max_workers=opts['workers']) as pool:
+            futures = {
+                pool.submit(images.render_derivatives, url, str(settings.MEDIA_ROOT), settings.MEDIA_URL): url
+                for url in todo
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    entries[url] = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{url}: {exc}')
+                    continue
+                # record progress in batches so an interrupted run keeps its work
+                if len(entries) >= 50:
+                    self._save(entries, by_url)
+                    entries = {}
+        self._save(entries, by_url)
+        self.stdout.write(f'{len(todo) - failed} processed, {failed} failed in {time.perf_counter() - started:.1f}s')
+
+    def _save(self, entries, by_url):
+        if not entries:
+            return
+        images.save_entries(entries)
+        pids = [pid for url in entries for pid in by_url[url]]
+        Product.objects.filter(pk__in=pids).touch()
+        invalidate_products(pids)
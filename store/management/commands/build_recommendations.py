@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Update the frequently-bought-together table from orders placed since the last run '
+            '(or, with --rebuild, from all order history). Run from cron, or with --loop as a worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='recount all orders instead of only new ones')
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K, help='recommendations kept per product')
+        parser.add_argument('--min-score', type=int, default=recommendations.MIN_SCORE,
+                            help='orders a pair must share to be recommended')
+        parser.add_argument('--loop', action='store_true', help='keep refreshing instead of exiting')
+        parser.add_argument('--interval', type=float, default=3600.0, help='seconds between refreshes with --loop')
+
+    def handle(self, *args, **opts):
+        def progress(items):
+            if opts['verbosity'] > 1:
+                self.stdout.write(f'{items} order items read')
+
+        rebuild = opts['rebuild']
+        while True:
+            started = time.perf_counter()
+            try:
+                stats = recommendations.refresh(rebuild, opts['top_k'], opts['min_score'], progress)
+            except recommendations.MissingDependency as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(
+                f"{stats['orders']} orders ({stats['items']} items) -> {stats['rows']} recommendations for "
+                f"{stats['products']} products in {time.perf_counter() - started:.2f}s "
+                f"(read {stats['read_s']:.2f}s, build {stats['build_s']:.2f}s, write {stats['write_s']:.2f}s)"
+            )
+            if not opts['loop']:
+                return
+            rebuild = False
+            time.sleep(opts['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import rollups
+
+
+class Command(BaseCommand):
+    help = ('Count orders into the sales rollup tables in chunks: by default only orders not counted yet '
+            '(backfill), or with --rebuild everything from scratch.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='clear the rollups and recount every order')
+        parser.add_argument('--force', action='store_true',
+                            help='with --rebuild: start even if an earlier rebuild was interrupted')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='orders per transaction')
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+
+        def progress(counted, last_id):
+            if opts['verbosity'] > 1:
+                self.stdout.write(f'{counted} orders counted (up to order {last_id})')
+
+        try:
+            if opts['rebuild']:
+                counted = rollups.rebuild(opts['chunk_size'], progress, force=opts['force'])
+            else:
+                counted = rollups.backfill(opts['chunk_size'], progress)
+        except rollups.RollupBusy as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f'{counted} orders counted in {time.perf_counter() - started:.1f}s')
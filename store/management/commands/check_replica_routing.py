@@ -0,0 +1,74 @@
+from contextlib import ExitStack
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store import db_routing
+from store.models import Order, OrderItem, OutboxEvent, Product
+
+CUSTOMER = {'name': 'replica check', 'email': 'replica@example.com', 'phone': '0', 'address': '-'}
+
+
+class Command(BaseCommand):
+    help = ('Check the read-replica routing through the full middleware stack: order confirmation '
+            'reads go to a replica, a browser that has just checked out reads its order from the '
+            'primary, and other browsers keep using the replica. Needs DB_REPLICA_URLS; locally, two '
+            'SQLite files (see sync_sqlite_replicas). The scratch product and order are deleted afterwards.')
+
+    def handle(self, *args, **opts):
+        if not db_routing.replicas():
+            raise CommandError('No replicas configured (DB_REPLICA_URLS)')
+        product = Product.objects.create(name='__replica_check__', price=Decimal('1.00'), stock=5, status='INACTIVE')
+        order_ids = []
+        try:
+            self._run(product, order_ids)
+        finally:
+            OrderItem.objects.filter(order_id__in=order_ids).delete()
+            Order.objects.filter(order_id__in=order_ids).delete()
+            OutboxEvent.objects.filter(topic='order.placed', payload__order_id__in=order_ids).delete()
+            product.delete()
+
+    def _get(self, client, url):
+        """GET ``url``; returns (status, {alias: number of queries touching store_order})."""
+        with ExitStack() as stack:
+            captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                        for alias in [DEFAULT_DB_ALIAS, *db_routing.replicas()]}
+            status = client.get(url).status_code
+        return status, {alias: sum('store_order' in q['sql'] for q in ctx.captured_queries)
+                        for alias, ctx in captured.items()}
+
+    def _report(self, what, status, reads):
+        where = ', '.join(f'{alias}: {n}' for alias, n in reads.items())
+        self.stdout.write(f'{what}: HTTP {status}; order queries by database: {where}')
+
+    def _run(self, product, order_ids):
+        buyer, other = Client(), Client()
+        buyer.post(reverse('add_to_cart_ajax', args=[product.pk]), {'quantity': 1})
+        prepared = buyer.post(reverse('checkout_prepare'), {'selected': str(product.pk)}).json()
+        if not prepared.get('success'):
+            raise CommandError(f'checkout_prepare failed: {prepared}')
+        response = buyer.post(reverse('checkout'), CUSTOMER)
+        order = Order.objects.filter(items__product=product).first()
+        if order is None:
+            raise CommandError(f'Checkout did not place an order (HTTP {response.status_code})')
+        order_ids.append(order.order_id)
+        if db_routing.PIN_COOKIE not in buyer.cookies:
+            raise CommandError('Checkout did not pin the buyer to the primary')
+        url = reverse('order_confirmation', args=[order.order_id])
+
+        status, reads = self._get(buyer, url)
+        self._report('buyer, right after checkout', status, reads)
+        if status != 200 or sum(reads.values()) != reads[DEFAULT_DB_ALIAS]:
+            raise CommandError('The buyer did not read their order from the primary')
+
+        status, reads = self._get(other, url)
+        self._report('another browser', status, reads)
+        if reads[DEFAULT_DB_ALIAS] or not sum(reads.values()):
+            raise CommandError('Another browser did not read from a replica')
+        if status == 404:
+            self.stdout.write('  (the replica has not caught up with the new order yet)')
+        self.stdout.write(self.style.SUCCESS('Replica routing OK.'))
@@ -0,0 +1,122 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from store.bulk_io import (FORMATS, RowError, chunked, clean_product_row, diff_product, guess_format,
+                           new_product_values, open_text, read_rows)
+from store.models import Product
+from store.signals import products_changed
+
+UPDATE_FIELDS = ('name', 'description', 'price', 'stock', 'image_url', 'status')
+
+
+class Command(BaseCommand):
+    help = ('Upsert products from a CSV or JSONL file (or - for stdin), matching on product_id. '
+            'Existing products only get the columns the input has; new ones need at least name and price. '
+            'Rows are streamed and written in chunks, each in its own transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="input file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='default: from the file extension (csv otherwise)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+        parser.add_argument('--show-diff', type=int, default=20, metavar='N',
+                            help='with --dry-run, print the first N changed rows field by field (default 20)')
+        parser.add_argument('--strict', action='store_true', help='abort on the first invalid row')
+
+    def handle(self, *args, **opts):
+        fmt = guess_format(opts['path'], opts['format'])
+        self.dry_run = opts['dry_run']
+        self.diffs_left = opts['show_diff'] if self.dry_run else 0
+        self.totals = {'created': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+        self.changed_pids = []
+        started_at = timezone.now()
+        started = time.perf_counter()
+        rows = 0
+        with open_text(opts['path'], 'r') as f:
+            for chunk in chunked(read_rows(f, fmt), opts['chunk_size']):
+                self._process_chunk(chunk, opts['strict'])
+                rows += len(chunk)
+                if opts['verbosity'] >= 2:
+                    self.stderr.write(f'{rows} rows, {rows / (time.perf_counter() - started):.0f} rows/s')
+        elapsed = time.perf_counter() - started
+
+        if not self.dry_run and (self.totals['created'] or self.totals['updated']):
+            if None in self.changed_pids:
+                # bulk_create doesn't return primary keys on MySQL: anything
+                # created since the import started is close enough
+                self.changed_pids = [pid for pid in self.changed_pids if pid is not None]
+                self.changed_pids += Product.objects.filter(created_at__gte=started_at).values_list('pk', flat=True)
+            products_changed(self.changed_pids)
+        prefix = 'Dry run, nothing written: would have ' if self.dry_run else ''
+        self.stdout.write(
+            f"{prefix}{self.totals['created']} created, {self.totals['updated']} updated, "
+            f"{self.totals['unchanged']} unchanged, {self.totals['invalid']} invalid; "
+            f"{rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+
+    def _invalid(self, line, exc, strict):
+        if strict:
+            raise CommandError(f'line {line}: {exc}')
+        self.totals['invalid'] += 1
+        self.stderr.write(f'line {line}: {exc}')
+
+    def _clean(self, chunk, strict):
+        cleaned = {}
+        new = []
+        for line, row in chunk:
+            try:
+                values = clean_product_row(row)
+            except RowError as exc:
+                self._invalid(line, exc, strict)
+                continue
+            if values['product_id'] is None:
+                new.append((line, values))
+            else:
+                cleaned[values['product_id']] = (line, values)  # a later duplicate wins
+        return cleaned, new
+
+    def _process_chunk(self, chunk, strict):
+        keyed, new = self._clean(chunk, strict)
+        existing = Product.objects.only('product_id', *UPDATE_FIELDS).in_bulk(list(keyed))
+        to_update = {}  # changed fields -> products, so each UPDATE writes only what changed
+        to_create = []
+        for line, values in new + [keyed[pid] for pid in keyed if pid not in existing]:
+            try:
+                values = new_product_values(values)
+            except RowError as exc:
+                self._invalid(line, exc, strict)
+                continue
+            to_create.append(Product(**values))
+        for pid, (_, values) in keyed.items():
+            product = existing.get(pid)
+            if product is None:
+                continue
+            changes = diff_product(product, values)
+            if not changes:
+                self.totals['unchanged'] += 1
+                continue
+            if self.diffs_left > 0:
+                self.diffs_left -= 1
+                self.stdout.write(f'~ {pid}: ' + '; '.join(f'{f}: {old!r} -> {new!r}' for f, (old, new) in changes.items()))
+            for field, (_, value) in changes.items():
+                setattr(product, field, value)
+            to_update.setdefault(tuple(sorted(changes)), []).append(product)
+        if self.diffs_left > 0:
+            for product in to_create[:self.diffs_left]:
+                self.stdout.write(f'+ {product.product_id or "(new)"}: {product.name}')
+            self.diffs_left -= min(self.diffs_left, len(to_create))
+
+        updated = [product for products in to_update.values() for product in products]
+        self.totals['created'] += len(to_create)
+        self.totals['updated'] += len(updated)
+        if self.dry_run:
+            return
+        with transaction.atomic():
+            if to_create:
+                Product.objects.bulk_create(to_create)
+            for fields, products in to_update.items():
+                Product.objects.bulk_update(products, fields)
+        self.changed_pids.extend(p.product_id for p in to_create + updated)
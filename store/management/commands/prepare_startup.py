@@ -0,0 +1,57 @@
+import hashlib
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+
+STAMP = '.collectstatic-stamp'
+
+
+def static_fingerprint():
+    """Hash of every collectable static file, plus the storage that collects them."""
+    digest = hashlib.sha1(settings.STORAGES['staticfiles']['BACKEND'].encode())
+    files = {}
+    for finder in finders.get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            files.setdefault(path, storage)  # first finder wins, as in collectstatic
+    for path in sorted(files):
+        digest.update(path.encode())
+        with files[path].open(path) as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Container startup: apply migrations and run collectstatic only when something changed, '
+            'in one process instead of two full manage.py runs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='migrate and collectstatic regardless')
+
+    def handle(self, *args, **opts):
+        started = time.perf_counter()
+        connection = connections['default']
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if plan or opts['force']:
+            self.stdout.write(f'applying {len(plan)} migration(s)')
+            call_command('migrate', interactive=False, verbosity=opts['verbosity'])
+        else:
+            self.stdout.write('migrations up to date')
+
+        stamp = Path(settings.STATIC_ROOT) / STAMP
+        fingerprint = static_fingerprint()
+        current = stamp.read_text().strip() if stamp.exists() else None
+        manifest = Path(settings.STATIC_ROOT) / 'staticfiles.json'
+        if current != fingerprint or not manifest.exists() or opts['force']:
+            self.stdout.write('static files changed, collecting')
+            call_command('collectstatic', interactive=False, verbosity=opts['verbosity'])
+            stamp.write_text(fingerprint)
+        else:
+            self.stdout.write('static files up to date')
+        self.stdout.write(f'startup checks took {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,68 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = ('Process outbox events (post-order work) in a thread pool: claim ready events in batches, '
+            'retry failures with backoff, and log queue depth and lag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='handler threads')
+        parser.add_argument('--batch-size', type=int, default=50, help='events claimed per round trip')
+        parser.add_argument('--lease', type=int, default=300,
+                            help='seconds before an unfinished claimed event may be claimed again')
+        parser.add_argument('--max-attempts', type=int, default=8, help='attempts before an event is marked FAILED')
+        parser.add_argument('--poll', type=float, default=1.0, help='seconds to sleep when the queue is empty')
+        parser.add_argument('--stats-interval', type=float, default=60.0, help='seconds between queue stats lines')
+        parser.add_argument('--keep-days', type=int, default=7, help='delete DONE events older than this')
+        parser.add_argument('--once', action='store_true', help='exit once no events are ready')
+
+    def handle(self, *args, **opts):
+        stopping = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stopping.append(True))
+        totals = {'done': 0, 'failed': 0}
+        next_stats = 0.0
+
+        def run(event, token):
+            close_old_connections()
+            try:
+                return outbox.process(event, token, opts['max_attempts'])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=opts['threads'], thread_name_prefix='outbox') as pool:
+            while not stopping:
+                if time.monotonic() >= next_stats:
+                    next_stats = time.monotonic() + opts['stats_interval']
+                    self._report(totals, opts['keep_days'])
+                try:
+                    token, events = outbox.claim(opts['batch_size'], opts['lease'])
+                except DatabaseError as exc:
+                    # e.g. SQLite busy while another worker claims; try again shortly
+                    self.stderr.write(f'claim failed: {exc}')
+                    events = []
+                if not events:
+                    if opts['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(opts['poll'])
+                    continue
+                for ok in pool.map(lambda e: run(e, token), events):
+                    totals['done' if ok else 'failed'] += 1
+        self._report(totals, None)
+
+    def _report(self, totals, keep_days):
+        if keep_days:
+            outbox.prune(keep_days)
+        stats = outbox.stats()
+        self.stdout.write(
+            f"outbox: depth {stats['depth']} ({stats['ready']} ready), lag {stats['lag_seconds']:.1f}s, "
+            f"{stats['failed']} failed; this worker: {totals['done']} done, {totals['failed']} failed attempts"
+        )
@@ -0,0 +1,92 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from store.models import OrderItem, Product
+from store.orders import OutOfStock, place_order
+from store.stress import retry, scratch_databases
+
+CUSTOMER = {
+    'customer_name': 'stress test',
+    'customer_email': 'stress@example.com',
+    'customer_phone': '0',
+    'shipping_address': '-',
+}
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent checkouts against one scratch product and verify there are no '
+            'oversells and that place_order issues the same number of queries for any cart size. '
+            'Runs in a throwaway test database (like manage.py test, so the database user needs '
+            'permission to create one).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=100, help='concurrent buyer threads')
+        parser.add_argument('--stock', type=int, default=25, help='initial stock of the contended product')
+        parser.add_argument('--qty', type=int, default=1, help='quantity each buyer orders')
+        parser.add_argument('--lines', type=int, default=20, help='cart size for the query-count check')
+
+    def handle(self, *args, **opts):
+        with scratch_databases():
+            self._check_oversell(opts)
+            self._check_query_count(opts['lines'])
+
+    def _check_oversell(self, opts):
+        product = Product.objects.create(name='__stress_checkout__', price=Decimal('1.00'), stock=opts['stock'], status='INACTIVE')
+        results = {'ok': 0, 'out_of_stock': 0, 'db_error': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(opts['buyers'])
+
+        def buyer():
+            outcome = 'ok'
+            try:
+                start.wait()
+                retry(lambda: place_order(CUSTOMER, {product.pk: opts['qty']}))
+            except OutOfStock:
+                outcome = 'out_of_stock'
+            except DatabaseError:
+                # still failing after the retries, e.g. SQLite "database is locked"
+                outcome = 'db_error'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=buyer) for _ in range(opts['buyers'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+        self.stdout.write(
+            f"{opts['buyers']} buyers in {elapsed:.2f}s: {results['ok']} orders, "
+            f"{results['out_of_stock']} out of stock, {results['db_error']} database errors; "
+            f"sold {sold}/{opts['stock']}, stock left {product.stock}"
+        )
+        if product.stock < 0 or sold > opts['stock'] or sold + product.stock != opts['stock']:
+            raise CommandError('Oversell detected')
+        if results['db_error']:
+            raise CommandError(f"{results['db_error']} buyer(s) failed with database errors; the run proves nothing")
+
+    def _check_query_count(self, lines):
+        products = [
+            Product.objects.create(name=f'__stress_checkout_{i}__', price=Decimal('2.50'), stock=1000, status='INACTIVE')
+            for i in range(max(lines, 1))
+        ]
+        counts = {}
+        for size in sorted({1, len(products)}):
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(CUSTOMER, {p.pk: 1 for p in products[:size]})
+            counts[size] = len(ctx.captured_queries)
+        self.stdout.write('queries per order by cart size: ' + ', '.join(f'{k} line(s): {v}' for k, v in counts.items()))
+        if len(set(counts.values())) != 1:
+            raise CommandError('place_order query count depends on cart size')
+        self.stdout.write(self.style.SUCCESS('No oversells; constant query count.'))
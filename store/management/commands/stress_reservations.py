@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from store import reservations
+from store.models import OrderItem, Product, StockReservation
+from store.orders import OutOfStock, place_order
+from store.stress import retry, scratch_databases
+
+CUSTOMER = {
+    'customer_name': 'stress test',
+    'customer_email': 'stress@example.com',
+    'customer_phone': '0',
+    'shipping_address': '-',
+}
+
+
+class Command(BaseCommand):
+    help = ('Run hundreds of concurrent buyers of one scratch product through hold -> checkout, '
+            'with some holds abandoned and released by a concurrent sweeper, and verify that '
+            'stock is never oversold and every held unit is accounted for. Runs in a throwaway test '
+            'database (like manage.py test, so the database user needs permission to create one).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=300, help='concurrent buyer threads')
+        parser.add_argument('--stock', type=int, default=50, help='initial stock of the contended product')
+        parser.add_argument('--max-qty', type=int, default=2, help='each buyer holds 1..max-qty units')
+        parser.add_argument('--abandon', type=float, default=0.3, help='fraction of buyers who never check out')
+        parser.add_argument('--hold', type=float, default=1.0, help='hold lifetime in seconds')
+
+    def handle(self, *args, **opts):
+        with scratch_databases():
+            product = Product.objects.create(name='__stress_reservations__', price=Decimal('1.00'),
+                                             stock=opts['stock'], status='INACTIVE')
+            self._run(product, opts)
+
+    def _run(self, product, opts):
+        results = {'held': 0, 'hold_refused': 0, 'ordered': 0, 'order_refused': 0, 'abandoned': 0, 'db_error': 0}
+        violations = []
+        lock = threading.Lock()
+        start = threading.Barrier(opts['buyers'])
+        done = threading.Event()
+
+        def count(outcome):
+            with lock:
+                results[outcome] += 1
+
+        def buyer(i):
+            holder = f'stress-{i}'
+            try:
+                start.wait()
+                try:
+                    qty = random.randint(1, opts['max_qty'])
+                    retry(lambda: reservations.reserve(holder, {product.pk: qty}, opts['hold']))
+                except OutOfStock:
+                    count('hold_refused')
+                    return
+                count('held')
+                if random.random() < opts['abandon']:
+                    count('abandoned')
+                    return
+                time.sleep(random.uniform(0, opts['hold'] / 2))
+                try:
+                    retry(lambda: place_order(CUSTOMER, {product.pk: 1}, holder=holder))
+                    count('ordered')
+                except OutOfStock:
+                    count('order_refused')
+            except DatabaseError:
+                # still failing after the retries, e.g. SQLite "database is locked"
+                count('db_error')
+            finally:
+                connection.close()
+
+        def watcher():
+            # the invariant has to hold at every instant, not just at the end
+            try:
+                while not done.is_set():
+                    stock, reserved = Product.objects.filter(pk=product.pk).values_list('stock', 'reserved').get()
+                    if reserved < 0 or reserved > stock or stock < 0:
+                        violations.append((stock, reserved))
+                    time.sleep(0.01)
+            finally:
+                connection.close()
+
+        def sweeper():
+            try:
+                while not done.is_set():
+                    try:
+                        reservations.sweep_expired(50)
+                    except DatabaseError:
+                        pass
+                    time.sleep(0.05)
+            finally:
+                connection.close()
+
+        background = [threading.Thread(target=watcher), threading.Thread(target=sweeper)]
+        threads = [threading.Thread(target=buyer, args=(i,)) for i in range(opts['buyers'])]
+        t0 = time.perf_counter()
+        for t in background + threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        done.set()
+        for t in background:
+            t.join()
+        # everything left is abandoned; release it as if it had expired
+        while reservations.sweep_expired(500, now=timezone.now() + timedelta(days=1)):
+            pass
+
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+        left = StockReservation.objects.filter(product=product).count()
+        self.stdout.write(
+            f"{opts['buyers']} buyers in {elapsed:.2f}s: " + ', '.join(f'{k} {v}' for k, v in results.items())
+            + f"; sold {sold}/{opts['stock']}, stock left {product.stock}, reserved {product.reserved}"
+        )
+        if violations:
+            raise CommandError(f'stock/reserved invariant broken {len(violations)} time(s), e.g. {violations[0]}')
+        if sold + product.stock != opts['stock'] or product.stock < 0:
+            raise CommandError('Oversell detected')
+        if product.reserved != 0 or left:
+            raise CommandError(f'{product.reserved} unit(s) still reserved after releasing every hold')
+        if results['db_error']:
+            raise CommandError(f"{results['db_error']} buyer(s) failed with database errors; the run proves nothing")
+        self.stdout.write(self.style.SUCCESS('No oversells; every held unit was sold or released.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.reservations import sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Release expired checkout stock holds in batches (run from cron, or with --loop as a worker).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='holds released per transaction')
+        parser.add_argument('--loop', action='store_true', help='keep sweeping instead of exiting when done')
+        parser.add_argument('--interval', type=float, default=10.0, help='seconds between sweeps with --loop')
+
+    def handle(self, *args, **opts):
+        while True:
+            released = 0
+            while True:
+                # short transactions, so checkouts touching the same products never wait long
+                n = sweep_expired(opts['batch_size'])
+                released += n
+                if n < opts['batch_size']:
+                    break
+            if released or opts['verbosity'] > 1:
+                self.stdout.write(f'released {released} expired hold(s)')
+            if not opts['loop']:
+                return
+            time.sleep(opts['interval'])
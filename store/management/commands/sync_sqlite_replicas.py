@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import db_routing
+
+SQLITE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = ('Copy the SQLite primary database over each SQLite replica: a stand-in for replication '
+            'when trying the read-replica routing locally (DATABASE_URL and DB_REPLICA_URLS pointing '
+            'at SQLite files). With --loop it repeats every --interval seconds, which is then the lag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='keep copying until interrupted')
+        parser.add_argument('--interval', type=float, default=2.0, help='seconds between copies with --loop')
+
+    def handle(self, *args, **opts):
+        primary = settings.DATABASES['default']
+        targets = [alias for alias in db_routing.replicas() if settings.DATABASES[alias]['ENGINE'] == SQLITE]
+        if primary['ENGINE'] != SQLITE or not targets:
+            raise CommandError('Needs an SQLite primary (DATABASE_URL) and SQLite replicas (DB_REPLICA_URLS)')
+        while True:
+            started = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            try:
+                for alias in targets:
+                    target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+            finally:
+                source.close()
+            self.stdout.write(f'copied primary to {", ".join(targets)} in {time.perf_counter() - started:.2f}s')
+            if not opts['loop']:
+                return
+            time.sleep(opts['interval'])
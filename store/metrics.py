@@ -0,0 +1,221 @@
+"""Process-local metric registry with a multi-worker Prometheus exposition.
+
+Each worker accumulates counters and histograms in memory (a dict update under
+a lock per observation) and, at most every FLUSH_INTERVAL seconds, writes a
+snapshot to ``<METRICS_DIR>/<pid>.json``. ``/metrics`` merges the snapshots
+of every worker, so whichever worker answers the scrape reports totals for the
+whole server. Snapshots of processes that have exited (recycled workers,
+management commands) are folded into ``retired.json`` by the next flush, so
+counters never go backwards and the directory doesn't grow. PIDs are only
+meaningful on one host: give each host (container) its own METRICS_DIR.
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger('store.perf')
+
+FLUSH_INTERVAL = 2.0
+RETIRED = 'retired.json'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'minishop_http_requests_total': ('counter', 'Requests by URL name, method and status code.'),
+    'minishop_http_request_duration_seconds': ('histogram', 'Request latency by URL name.'),
+    'minishop_db_queries_total': ('counter', 'Database queries by URL name.'),
+    'minishop_db_query_seconds_total': ('counter', 'Time spent in database queries by URL name.'),
+    'minishop_template_render_seconds_total': ('counter', 'Time spent rendering templates by URL name.'),
+    'minishop_session_save_seconds_total': ('counter', 'Time spent saving sessions by URL name.'),
+    'minishop_catalog_cache_events_total': ('counter', 'Catalog cache hits, misses and invalidations.'),
+}
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> value
+_histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', None) or Path(tempfile.gettempdir()) / 'minishop-metrics')
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, labels, value=1):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    key = (name, _labels(labels))
+    with _lock:
+        buckets = _histograms.get(key)
+        if buckets is None:
+            buckets = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+                break
+        else:
+            buckets[len(LATENCY_BUCKETS)] += 1
+        buckets[-1] += value
+
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), list(values)] for (name, labels), values in _histograms.items()],
+        }
+
+
+def maybe_flush(force=False):
+    """Write this process's snapshot if FLUSH_INTERVAL has passed since the last one.
+
+    Called after the response is built, so it logs I/O errors rather than
+    failing the request.
+    """
+    global _last_flush
+    if not _flush_lock.acquire(blocking=False):
+        return  # another thread is flushing right now
+    try:
+        now = time.monotonic()
+        if not force and now - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        directory = metrics_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        _write(directory / f'{os.getpid()}.json', snapshot())
+        _retire_exited(directory)
+    except OSError:
+        logger.warning('Could not write metrics to %s', metrics_dir(), exc_info=True)
+    finally:
+        _flush_lock.release()
+
+
+def _write(path, snap):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.stem}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snap, f)
+        os.replace(tmp, path)  # atomic: readers never see a half-written file
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, but belongs to another user
+    return True
+
+
+def _locked(directory, shared=False):
+    """Lock the directory against _retire_exited, which moves counts between files."""
+    lock = open(directory / '.lock', 'a')
+    fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    return lock  # closing it releases the lock
+
+
+def _retire_exited(directory):
+    """Fold the snapshots of exited processes into retired.json."""
+    exited = [path for path in directory.glob('*.json') if path.stem.isdigit() and not _alive(int(path.stem))]
+    if not exited:
+        return
+    with _locked(directory):
+        exited = [path for path in exited if path.exists()]  # another worker may have got there first
+        retired = directory / RETIRED
+        snapshots = [_read(path) for path in [retired, *exited]]
+        _write(retired, _as_snapshot(*_combine(snap for snap in snapshots if snap)))
+        for path in exited:
+            path.unlink()
+
+
+def _combine(snapshots):
+    counters = {}
+    histograms = {}
+    for snap in snapshots:
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snap['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, v in enumerate(values):
+                merged[i] += v
+    return counters, histograms
+
+
+def _as_snapshot(counters, histograms):
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), values] for (name, labels), values in histograms.items()],
+    }
+
+
+def _merged():
+    own = f'{os.getpid()}.json'
+    snapshots = [snapshot()]
+    directory = metrics_dir()
+    if directory.is_dir():
+        with _locked(directory, shared=True):
+            snapshots += [_read(path) for path in directory.glob('*.json') if path.name != own]
+    return _combine(snap for snap in snapshots if snap)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render():
+    """Prometheus text exposition of all workers' metrics."""
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f'{name}{_fmt_labels(labels)} {value}')
+        else:
+            for (n, labels), values in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_fmt_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_count{_fmt_labels(labels)} {cumulative}')
+                lines.append(f'{name}_sum{_fmt_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
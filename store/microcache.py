@@ -0,0 +1,100 @@
+"""Conditional GET and nginx microcaching for the catalog pages.
+
+``cacheable`` wraps a view in Django's conditional-GET handling, so a request
+whose ETag still matches gets a 304 without the page being rendered. It also
+marks the view's 200 and 304 responses cacheable:
+
+- browsers revalidate on every use (``max-age=0``);
+- nginx keeps a copy for MICROCACHE_SECONDS (``X-Accel-Expires``, which nginx
+  doesn't pass on; see compose/nginx.conf);
+- ``Surrogate-Key`` names what the page was built from, for CDNs that purge
+  by key.
+
+ETags hash the versions of the products on the page with the release (the
+static files manifest hash and RELEASE), so a deploy changes them too.
+Wrapped views mustn't vary per visitor: the cart badge and stock counts
+load by AJAX.
+
+nginx can't purge by key, so when the catalog cache is invalidated,
+``changed`` queues a 'catalog.changed' outbox event. Its handler maps the
+keys to the URLs that carry them. It then fetches those through nginx with
+``X-Cache-Refresh: 1``, so nginx replaces its copy. Cursor pages of the
+catalog aren't refreshed and expire after MICROCACHE_SECONDS.
+"""
+import hashlib
+import urllib.error
+import urllib.request
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import catalog, outbox
+
+# beyond this many products in one change only the catalog pages are refreshed
+MAX_PURGE_PRODUCTS = 100
+
+
+def release():
+    return getattr(settings, 'RELEASE', '') + getattr(staticfiles_storage, 'manifest_hash', '')
+
+
+def etag(*parts):
+    return hashlib.sha1(repr((release(), parts)).encode()).hexdigest()
+
+
+def cacheable(etag_func, last_modified_func=None, keys=None):
+    """Conditional GET plus browser/nginx cache headers for a page that's the same for everyone.
+
+    ``keys(request, *args, **kwargs)`` returns the page's surrogate keys.
+    """
+    def decorator(view):
+        conditional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304) and response.has_header('ETag'):
+                patch_cache_control(response, public=True, max_age=0)
+                response['X-Accel-Expires'] = str(getattr(settings, 'MICROCACHE_SECONDS', 30))
+                if keys:
+                    response['Surrogate-Key'] = ' '.join(keys(request, *args, **kwargs))
+            return response
+        return wrapper
+    return decorator
+
+
+def changed(pids, with_catalog=True):
+    """Queue a refresh of the cached pages of ``pids`` and (unless not
+    ``with_catalog``) of the catalog."""
+    if getattr(settings, 'MICROCACHE_PURGE_URL', None):
+        pids = list(pids)
+        if len(pids) > MAX_PURGE_PRODUCTS:
+            if not with_catalog:
+                return  # the product pages expire on their own
+            pids = []
+        outbox.emit('catalog.changed', {'pids': pids, 'catalog': with_catalog})
+
+
+def urls_for(pids, with_catalog=True):
+    # the pages whose Surrogate-Key includes 'catalog' or a product-<id> of pids
+    urls = [reverse('home')] + [f"{reverse('home')}?sort={sort}" for sort in catalog.SORTS] if with_catalog else []
+    return urls + [reverse('product_detail', args=[pid]) for pid in pids]
+
+
+def purge(pids, with_catalog=True):
+    """Make nginx re-fetch the pages of ``pids`` and (unless not ``with_catalog``) the catalog now."""
+    base = getattr(settings, 'MICROCACHE_PURGE_URL', None)
+    if not base:
+        return
+    for url in urls_for(pids, with_catalog):
+        request = urllib.request.Request(base.rstrip('/') + url, headers={'X-Cache-Refresh': '1'})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except urllib.error.HTTPError as exc:
+            if exc.code != 404:  # a deleted product: its copy expires on its own
+                raise
@@ -0,0 +1,211 @@
+import contextvars
+import logging
+import time
+from importlib import import_module
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template as DjangoBackendTemplate
+
+from . import db_routing, metrics
+
+logger = logging.getLogger('store.perf')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db_time', 'template_time', 'session_time', 'sql')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.session_time = 0.0
+        self.sql = {}  # SQL text (parameters excluded) -> [count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every query of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            entry = self.sql.get(sql)
+            if entry is None:
+                self.sql[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def dominant_sql(self):
+        if not self.sql:
+            return None
+        sql, (count, seconds) = max(self.sql.items(), key=lambda item: item[1][1])
+        return sql, count, seconds
+
+
+def _timed(attr, func):
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setattr(timings, attr, getattr(timings, attr) + time.perf_counter() - start)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def _execute(execute, sql, params, many, context):
+    # installed on every connection; a no-op outside an instrumented request
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _install_hooks():
+    # Database connections are per thread, and under ASGI the ORM runs in
+    # executor threads, so the query hook is installed on each connection and
+    # finds the request through the context variable (which sync_to_async
+    # carries into those threads) rather than being entered per request.
+    connection_created.connect(_wrap_connection, dispatch_uid='store.middleware')
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(None, connection)
+    # Only top-level renders go through the backend Template ({% include %}
+    # renders nested engine templates), so nothing is counted twice.
+    if not hasattr(DjangoBackendTemplate.render, '__wrapped__'):
+        DjangoBackendTemplate.render = _timed('template_time', DjangoBackendTemplate.render)
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store.save, '__wrapped__'):
+        store.save = _timed('session_time', store.save)
+
+
+class PerformanceMiddleware:
+    """Per-request latency, query, template and session-save timings.
+
+    Adds a Server-Timing header, records metrics for /metrics per URL name and
+    logs requests slower than SLOW_REQUEST_MS with the SQL statement that took
+    the most total time. Keep it first in MIDDLEWARE so the timings cover the
+    other middleware, including the session save. Works under both WSGI and
+    ASGI, so it doesn't force async views back onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install_hooks()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, timings, time.perf_counter() - start)
+
+    def _record(self, request, response, timings, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        labels = {'view': view}
+        metrics.observe('minishop_http_request_duration_seconds', labels, elapsed)
+        metrics.inc('minishop_http_requests_total', {'view': view, 'method': request.method, 'status': response.status_code})
+        if timings.queries:
+            metrics.inc('minishop_db_queries_total', labels, timings.queries)
+            metrics.inc('minishop_db_query_seconds_total', labels, timings.db_time)
+        if timings.template_time:
+            metrics.inc('minishop_template_render_seconds_total', labels, timings.template_time)
+        if timings.session_time:
+            metrics.inc('minishop_session_save_seconds_total', labels, timings.session_time)
+        metrics.maybe_flush()
+
+        response['Server-Timing'] = ', '.join([
+            f'app;dur={elapsed * 1000:.1f}',
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+            f'tpl;dur={timings.template_time * 1000:.1f}',
+            f'session;dur={timings.session_time * 1000:.1f}',
+        ])
+        if elapsed * 1000 >= self.slow_ms:
+            dominant = timings.dominant_sql()
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms%s',
+                request.method, request.path, view, elapsed * 1000, timings.queries, timings.db_time * 1000,
+                timings.template_time * 1000,
+                '; dominant SQL (%dx, %.0f ms): %s' % (dominant[1], dominant[2] * 1000, dominant[0]) if dominant else '',
+            )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks writes for store/db_routing.py and pins writing browsers to the primary.
+
+    Place it after SessionMiddleware. A no-op without DATABASE_REPLICAS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not db_routing.replicas():
+            return self.get_response(request)
+        state = db_routing.RequestRouting()
+        token = db_routing.request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_routing.request_state.reset(token)
+        return self._pin(request, response, state)
+
+    async def __acall__(self, request):
+        if not db_routing.replicas():
+            return await self.get_response(request)
+        state = db_routing.RequestRouting()
+        token = db_routing.request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_routing.request_state.reset(token)
+        return self._pin(request, response, state)
+
+    def _pin(self, request, response, state):
+        if state.wrote and db_routing.PIN_COOKIE not in request.COOKIES:
+            # no max_age: lasts until the browser closes
+            response.set_cookie(db_routing.PIN_COOKIE, '1', httponly=True, samesite='Lax',
+                                secure=settings.SESSION_COOKIE_SECURE)
+        return response
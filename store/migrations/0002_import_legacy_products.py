@@ -1,13 +1,13 @@
-from django.db import migrations, connection
+from django.db import migrations
 
 
 def copy_legacy_products(apps, schema_editor):
     """If a legacy `products` table exists, copy its rows into `store_product`.
     This runs only if `store_product` is empty and `products` exists."""
+    connection = schema_editor.connection
     with connection.cursor() as cursor:
-        # Check if legacy table exists
-        cursor.execute("SHOW TABLES LIKE 'products'")
-        if cursor.fetchone() is None:
+        # Check if legacy table exists (portably, so SQLite dev databases migrate too)
+        if 'products' not in connection.introspection.table_names(cursor):
             return
         # Check if store_product already has rows
         cursor.execute("SELECT COUNT(*) FROM store_product")
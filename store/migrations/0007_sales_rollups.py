@@ -0,0 +1,60 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def name_existing_handlers(apps, schema_editor):
+    # events written before handlers were recorded per row all went to the
+    # only handler there was
+    OutboxEvent = apps.get_model('store', 'OutboxEvent')
+    OutboxEvent.objects.filter(topic='order.placed', handler='').update(handler='store.events.send_order_confirmation')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_outbox_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('rebuilding', models.BooleanField(default=False)),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='handler',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='store.product')),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-units'], name='productsales_units_idx')],
+            },
+        ),
+        migrations.RunPython(name_existing_handlers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:31
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def updated_at_from_created_at(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Product.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(updated_at_from_created_at, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,4 +1,11 @@
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+class ProductQuerySet(models.QuerySet):
+    def touch(self):
+        """Mark the products changed (new version, updated_at) without saving them."""
+        return self.update(version=F('version') + 1, updated_at=timezone.now())
 
 class Product(models.Model):
     product_id = models.AutoField(primary_key=True)
@@ -6,9 +13,53 @@ class Product(models.Model):
     description = models.CharField(max_length=500, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField()
+    # units held by unexpired-or-unswept StockReservations; available = stock - reserved
+    reserved = models.IntegerField(default=0)
     image_url = models.CharField(max_length=255, blank=True)
     status = models.CharField(max_length=10, default='ACTIVE')
     created_at = models.DateTimeField(auto_now_add=True)
+    # what the storefront shows of the product changed: new ETags for its pages
+    # (store/microcache.py); stock and reserved changes don't count
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # back the storefront's keyset pagination (see store/catalog.py)
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'product_id'], name='product_status_created_idx'),
+            models.Index(fields=['status', 'price', 'product_id'], name='product_status_price_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        product = super().from_db(db, field_names, values)
+        product._loaded_stock = product.__dict__.get('stock')  # see save()
+        return product
+
+    def save(self, *args, **kwargs):
+        # reserved is a counter updated in place by store/reservations.py, and
+        # checkouts take stock in place (store/orders.py): saving a loaded
+        # instance (admin, manage forms) must not write back stale copies. An
+        # edited stock is applied as the change from the value it was loaded
+        # with (or that ProductForm was opened with).
+        edit = not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        stock_edited = False
+        if edit:
+            loaded = getattr(self, '_loaded_stock', None)
+            stock_edited = 'stock' in self.__dict__ and self.stock != loaded
+            if stock_edited and loaded is not None:
+                self.stock = F('stock') + (self.stock - loaded)
+            skip = {'reserved'} if stock_edited else {'reserved', 'stock'}
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name not in skip]
+            # in SQL, so two concurrent edits can't end up with the same version
+            self.version = F('version') + 1
+        super().save(*args, **kwargs)
+        if edit:
+            self.refresh_from_db(fields=['version', 'stock'] if stock_edited else ['version'])
+            self._loaded_stock = self.__dict__.get('stock')
 
     def __str__(self):
         return self.name
@@ -20,7 +71,10 @@ class Order(models.Model):
     customer_phone = models.CharField(max_length=20)
     shipping_address = models.CharField(max_length=255)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # indexed for the admin's date hierarchy/ordering and date-range exports
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # counted in the sales rollups (store/rollups.py)
+    rolled_up = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Order {self.order_id} - {self.customer_name}"
@@ -35,3 +89,120 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
+
+class StockReservation(models.Model):
+    """Units of a product held for one checkout until ``expires_at``.
+
+    There is at most one row per holder and product; ``Product.reserved`` is
+    the sum of the rows for that product (see store/reservations.py).
+    """
+    reservation_id = models.AutoField(primary_key=True)
+    holder = models.CharField(max_length=40)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'], name='reservation_holder_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.holder}: {self.product_id} x{self.quantity}"
+
+class OutboxEvent(models.Model):
+    """Work to do after a transaction commits, written in that transaction.
+
+    run_outbox_worker claims ready events (PENDING with available_at in the
+    past), runs the handler registered for the topic and marks them DONE, or
+    schedules a retry with backoff until max attempts, then FAILED. See
+    store/outbox.py.
+    """
+    PENDING = 'PENDING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    event_id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    # dotted name of the handler this row is for (store.outbox.handler)
+    handler = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # next time the event may be claimed: retry backoff, or a claim's lease
+    available_at = models.DateTimeField()
+    # token of the worker batch currently holding the event
+    claim = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} -> {self.handler or '?'} #{self.event_id} ({self.status})"
+
+class DailySales(models.Model):
+    """Orders, units and revenue per day (UTC), maintained by store/rollups.py."""
+    day = models.DateField(primary_key=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, ${self.revenue}"
+
+class ProductSales(models.Model):
+    """All-time units and revenue per product, maintained by store/rollups.py."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        # the dashboard's top sellers
+        indexes = [models.Index(fields=['-units'], name='productsales_units_idx')]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units} units"
+
+class RollupState(models.Model):
+    """One row per rollup; ``rebuilding`` pauses incremental updates during a rebuild."""
+    name = models.CharField(max_length=20, primary_key=True)
+    rebuilding = models.BooleanField(default=False)
+    rebuilt_at = models.DateTimeField(null=True, blank=True)
+
+class CacheVersion(models.Model):
+    """A version cache keys embed, shared by every process (store/catalog_cache.py)."""
+    name = models.CharField(max_length=20, primary_key=True)
+    version = models.BigIntegerField()
+
+class SearchChange(models.Model):
+    """A product whose search entry changed; every process's index applies these (store/search.py)."""
+    id = models.BigAutoField(primary_key=True)
+    # no foreign key: deletions are changes too
+    product_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+class RelatedProduct(models.Model):
+    """Frequently bought together: the top products ordered along with ``product``.
+
+    Precomputed from order history by store/recommendations.py; ``score`` is
+    the number of orders that contain both.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_products')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.IntegerField()
+
+    class Meta:
+        # also the index product pages read through: product_id = ? ORDER BY rank
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='related_product_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
@@ -0,0 +1,87 @@
+"""Order placement: one transaction, a fixed number of queries per order."""
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from . import outbox, reservations
+from .models import Order, OrderItem, Product
+
+
+class OutOfStock(Exception):
+    """Raised when some lines cannot be fulfilled; nothing is written."""
+
+    def __init__(self, pids):
+        super().__init__(f'Insufficient stock for products {sorted(pids)}')
+        self.pids = sorted(pids)
+
+
+def place_order(customer, quantities, holder=None):
+    """Create an order for ``quantities`` ({product_id: qty}) and take the stock.
+
+    ``customer`` holds the Order's customer_* / shipping_address fields. Prices
+    come from the database, never from the caller. Units other checkouts have
+    on hold (``Product.reserved``) can't be sold; ``holder``'s own holds are
+    converted into the sale. Regardless of cart size this runs a locking
+    SELECT, one conditional UPDATE, the Order INSERT, one bulk INSERT for the
+    items and the 'order.placed' outbox event, plus the hold conversion when
+    there is a holder. Follow-up work (emails and the like) belongs in outbox
+    handlers (store/events.py), not in the checkout request.
+    """
+    quantities = {int(pid): int(qty) for pid, qty in quantities.items() if int(qty) > 0}
+    if not quantities:
+        raise ValueError('No items to order')
+    pids = sorted(quantities)
+    with transaction.atomic():
+        held = reservations.take_holds(holder) if holder else {}
+        # lock rows in primary-key order so concurrent checkouts can't deadlock
+        products = list(
+            Product.objects.select_for_update()
+            .filter(product_id__in=pids)
+            .only('product_id', 'price', 'stock', 'reserved')
+            .order_by('product_id')
+        )
+        found = {p.product_id for p in products}
+        short = {p.product_id for p in products
+                 if p.stock - p.reserved + held.get(p.product_id, 0) < quantities[p.product_id]}
+        short |= set(pids) - found
+        if short:
+            raise OutOfStock(short)
+
+        # The stock__gte guard makes the decrement safe even where
+        # select_for_update is a no-op (SQLite): a row that lost a race is
+        # simply not updated, and the rowcount check rolls the order back.
+        # Every one of the holder's holds is given back, including any for
+        # products that are no longer in the order.
+        condition = reduce(or_, (
+            Q(product_id=pid, stock__gte=F('reserved') - held.get(pid, 0) + qty) for pid, qty in quantities.items()
+        ))
+        changes = {'stock': Case(*(When(product_id=pid, then=F('stock') - qty) for pid, qty in quantities.items()))}
+        if held:
+            changes['reserved'] = Case(*(When(product_id=pid, then=F('reserved') - n) for pid, n in held.items()),
+                                       default=F('reserved'))
+        updated = Product.objects.filter(condition).update(**changes)
+        if updated != len(pids):
+            raise OutOfStock(set(pids))
+        extra = {pid: n for pid, n in held.items() if pid not in quantities}
+        if extra:
+            reservations.give_back(extra)
+
+        lines = []
+        total = Decimal('0.00')
+        for p in products:
+            qty = quantities[p.product_id]
+            subtotal = p.price * qty
+            total += subtotal
+            lines.append((p, qty, subtotal))
+        order = Order.objects.create(total_amount=total, **customer)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=p, quantity=qty, unit_price=p.price, subtotal=subtotal)
+            for p, qty, subtotal in lines
+        ])
+        outbox.emit('order.placed', {'order_id': order.order_id})
+        # no cache invalidation: product pages show stock through
+        # reservations.available, outside the cached fragments
+    return order
@@ -0,0 +1,121 @@
+"""Transactional outbox: post-commit work without a message broker.
+
+``emit`` inserts OutboxEvents in the caller's transaction, so events exist
+exactly when the change that caused them was committed: one row per handler
+registered for the topic with ``@handler(topic)``, so each handler succeeds,
+retries or fails on its own. The run_outbox_worker command claims ready
+events in batches and runs their handlers.
+
+Delivery is at least once (a worker that dies mid-batch leaves its events to
+be claimed again once the lease runs out), so handlers must be idempotent.
+"""
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger('store.outbox')
+
+BACKOFF_BASE = 5        # seconds before the first retry, doubled per attempt
+BACKOFF_CAP = 3600
+
+_handlers = {}  # topic -> {handler name: function}
+
+
+def handler(topic):
+    """Register the decorated function as a handler for ``topic``; it gets the payload."""
+    def register(func):
+        _handlers.setdefault(topic, {})[f'{func.__module__}.{func.__name__}'] = func
+        return func
+    return register
+
+
+def emit(topic, payload):
+    """Record an event for each handler of ``topic`` (one INSERT).
+
+    Call inside the transaction that makes the change the event describes.
+    """
+    now = timezone.now()
+    names = list(_handlers.get(topic, ())) or ['']
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, handler=name, payload=payload, available_at=now) for name in names
+    ])
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))  # jitter spreads retries of a burst
+
+
+def claim(batch_size, lease):
+    """Claim up to ``batch_size`` ready events for ``lease`` seconds; returns (token, events).
+
+    Where the database has SKIP LOCKED, concurrent workers pass over each
+    other's candidate rows instead of waiting. The guarded UPDATE is what
+    makes a claim exclusive everywhere, SQLite included: an event another
+    worker claimed first no longer matches and isn't returned.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ready = OutboxEvent.objects.filter(status=OutboxEvent.PENDING, available_at__lte=now)
+    with transaction.atomic():
+        candidates = ready.order_by('available_at', 'event_id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('event_id', flat=True)[:batch_size])
+        if not ids:
+            return token, []
+        ready.filter(event_id__in=ids).update(
+            claim=token, available_at=now + timedelta(seconds=lease), attempts=F('attempts') + 1)
+    return token, list(OutboxEvent.objects.filter(claim=token).order_by('event_id'))
+
+
+def process(event, token, max_attempts):
+    """Run one claimed event's handler and record the outcome; returns True on success."""
+    func = _handlers.get(event.topic, {}).get(event.handler)
+    try:
+        if func is None:
+            raise LookupError(f'no handler {event.handler!r} for topic {event.topic!r}')
+        func(event.payload)
+    except Exception as exc:
+        final = func is None or event.attempts >= max_attempts
+        changes = {'claim': '', 'last_error': f'{type(exc).__name__}: {exc}'[:2000]}
+        if final:
+            changes['status'] = OutboxEvent.FAILED
+        else:
+            changes['available_at'] = timezone.now() + backoff(event.attempts)
+        OutboxEvent.objects.filter(pk=event.pk, claim=token).update(**changes)
+        logger.warning('Outbox event %s failed on attempt %d%s: %s', event, event.attempts,
+                       ', giving up' if final else '', exc, exc_info=final)
+        return False
+    OutboxEvent.objects.filter(pk=event.pk, claim=token).update(
+        status=OutboxEvent.DONE, claim='', processed_at=timezone.now())
+    return True
+
+
+def stats():
+    """Queue depth (pending events), how many are ready now, failures and lag in seconds.
+
+    Lag is the age of the oldest pending event: how far behind the workers are.
+    """
+    now = timezone.now()
+    pending = OutboxEvent.objects.filter(status=OutboxEvent.PENDING)
+    agg = pending.aggregate(depth=Count('pk'), oldest=Min('created_at'))
+    return {
+        'depth': agg['depth'],
+        'ready': pending.filter(available_at__lte=now).count(),
+        'failed': OutboxEvent.objects.filter(status=OutboxEvent.FAILED).count(),
+        'lag_seconds': round((now - agg['oldest']).total_seconds(), 3) if agg['oldest'] else 0.0,
+    }
+
+
+def prune(days):
+    """Delete DONE events processed more than ``days`` ago; returns how many."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboxEvent.objects.filter(status=OutboxEvent.DONE, processed_at__lt=cutoff).delete()[0]
@@ -0,0 +1,40 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# below this many rows an exact COUNT(*) is cheap enough to always run
+ESTIMATE_THRESHOLD = 50000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids COUNT(*) over whole large tables.
+
+    For an unfiltered queryset on MySQL the row count comes from the table
+    statistics in information_schema, which is approximate but instant; once
+    that estimate is under ESTIMATE_THRESHOLD, or the queryset is filtered
+    (where a COUNT can use an index), or on other databases, the exact count
+    is used.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self._estimate()
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+    def _estimate(self):
+        qs = self.object_list
+        query = getattr(qs, 'query', None)
+        if query is None or query.where or query.distinct or getattr(qs, 'db', None) is None:
+            return None
+        connection = connections[qs.db]
+        if connection.vendor != 'mysql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [qs.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
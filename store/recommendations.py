@@ -0,0 +1,197 @@
+"""Frequently-bought-together recommendations, precomputed from order history.
+
+The build_recommendations command turns OrderItem rows into a sparse
+order x product matrix B and computes the product co-occurrence matrix
+C = BᵀB (C[a, b] is the number of orders containing both a and b) with
+SciPy. The top TOP_K entries of each row go to the RelatedProduct table,
+which product pages read with one indexed query.
+
+C is kept in RECOMMENDATIONS_STATE (an .npz file) together with the last
+order it includes. A refresh then only reads newer orders, adds their
+co-occurrences to C, and rewrites the rows of the products they contain.
+Orders less than SETTLE_SECONDS old are left for the next run, so an order
+whose transaction commits late isn't skipped. Deleted orders stay counted
+until a ``--rebuild``.
+
+NumPy and SciPy are only needed to build; the site reads the table.
+"""
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import microcache
+from .bulk_io import iter_keyset
+from .models import OrderItem, Product, RelatedProduct
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # web containers don't need them
+    np = None
+    sparse = None
+
+TOP_K = 8
+MIN_SCORE = 2           # pairs bought together fewer times than this are noise
+SETTLE_SECONDS = 60
+READ_CHUNK = 50000
+WRITE_CHUNK = 1000      # products per transaction when rewriting their rows
+
+
+class MissingDependency(RuntimeError):
+    pass
+
+
+def related(pid, limit=TOP_K):
+    """The active products most often bought with ``pid``, best first (one query)."""
+    rows = (RelatedProduct.objects.filter(product_id=pid, related__status='ACTIVE')
+            .select_related('related')
+            .only('related__product_id', 'related__name', 'related__price', 'related__image_url')
+            .order_by('rank')[:limit])
+    return [row.related for row in rows]
+
+
+def related_versions(pid, limit=TOP_K):
+    """(product id, version, updated_at) of what ``related(pid)`` returns, for cache keys."""
+    return list(RelatedProduct.objects.filter(product_id=pid, related__status='ACTIVE')
+                .order_by('rank')
+                .values_list('related_id', 'related__version', 'related__updated_at')[:limit])
+
+
+def state_path():
+    return Path(getattr(settings, 'RECOMMENDATIONS_STATE', Path(settings.BASE_DIR) / 'var' / 'copurchase.npz'))
+
+
+def load_state(path):
+    """(co-occurrence matrix, last order id) from ``path``, or (None, 0)."""
+    if not path.exists():
+        return None, 0
+    with np.load(path) as f:
+        matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        return matrix, int(f['last_order_id'])
+
+
+def save_state(path, matrix, last_order_id):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp.npz')
+    np.savez(tmp, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+             shape=np.array(matrix.shape), last_order_id=np.array(last_order_id))
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def cooccurrence(order_ids, product_ids, n_products):
+    """Sparse ``n_products`` x ``n_products`` co-occurrence counts of the baskets
+    given as parallel arrays of (order id, product id), diagonal excluded."""
+    rows = np.unique(order_ids, return_inverse=True)[1].ravel()
+    baskets = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, product_ids)),
+        shape=(rows.max() + 1 if len(rows) else 0, n_products),
+    )
+    baskets.data[:] = 1  # a product listed twice in one order counts once
+    matrix = (baskets.T @ baskets).tocsr()
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def resize(matrix, n):
+    if matrix.shape[0] >= n:
+        return matrix
+    matrix = matrix.copy()
+    matrix.resize((n, n))
+    return matrix
+
+
+def top_k(matrix, rows, k=TOP_K, min_score=MIN_SCORE):
+    """The ``k`` best (row, column, score, rank) of each of ``rows``, as arrays.
+
+    Vectorized: the nonzeros of the rows are sorted by (row, -score, column)
+    and each entry's rank is its offset from the start of its row's run.
+    """
+    sub = matrix[rows].tocoo()
+    keep = sub.data >= min_score
+    r, c, s = np.asarray(rows)[sub.row[keep]], sub.col[keep], sub.data[keep]
+    order = np.lexsort((c, -s, r))
+    r, c, s = r[order], c[order], s[order]
+    rank = np.arange(len(r)) - np.searchsorted(r, r, side='left')
+    best = rank < k
+    return r[best], c[best], s[best], rank[best]
+
+
+def _read_items(after, before, progress=None):
+    """(order ids, product ids) of the items of orders ``after`` < id, created before ``before``."""
+    items = OrderItem.objects.filter(order_id__gt=after, order__created_at__lt=before).values(
+        'order_item_id', 'order_id', 'product_id')
+    order_ids, product_ids = [], []
+    for chunk in iter_keyset(items, 'order_item_id', READ_CHUNK):
+        order_ids.append(np.fromiter((row['order_id'] for row in chunk), dtype=np.int64, count=len(chunk)))
+        product_ids.append(np.fromiter((row['product_id'] for row in chunk), dtype=np.int64, count=len(chunk)))
+        if progress:
+            progress(sum(len(a) for a in order_ids))
+    if not order_ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(order_ids), np.concatenate(product_ids)
+
+
+def _write(r, c, s, rank, pids):
+    """Replace the RelatedProduct rows of ``pids`` with the given top-k entries."""
+    pids = sorted(int(p) for p in pids)
+    # order history still names products deleted since
+    live = set(Product.objects.values_list('pk', flat=True))
+    by_product = {}
+    for a, b, score, n in zip(r.tolist(), c.tolist(), s.tolist(), rank.tolist()):
+        if b in live:
+            by_product.setdefault(a, []).append(RelatedProduct(product_id=a, related_id=b, rank=n, score=score))
+    for start in range(0, len(pids), WRITE_CHUNK):
+        chunk = pids[start:start + WRITE_CHUNK]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=chunk).delete()
+            RelatedProduct.objects.bulk_create(
+                [row for pid in chunk if pid in live for row in by_product.get(pid, [])], batch_size=1000)
+
+
+def refresh(rebuild=False, k=TOP_K, min_score=MIN_SCORE, progress=None):
+    """Bring the co-occurrence matrix and RelatedProduct up to date; returns stats.
+
+    Only orders newer than the stored state are read unless ``rebuild``.
+    """
+    if np is None or sparse is None:
+        raise MissingDependency('Building recommendations needs numpy and scipy')
+    started = time.perf_counter()
+    path = state_path()
+    matrix, last_order_id = (None, 0) if rebuild else load_state(path)
+    before = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    order_ids, product_ids = _read_items(last_order_id, before, progress)
+    read_s = time.perf_counter() - started
+    if not len(order_ids) and matrix is not None:
+        return {'orders': 0, 'items': 0, 'products': 0, 'rows': 0, 'read_s': read_s, 'build_s': 0.0, 'write_s': 0.0}
+
+    t = time.perf_counter()
+    n = int(max(product_ids.max(initial=0), matrix.shape[0] - 1 if matrix is not None else 0)) + 1
+    delta = cooccurrence(order_ids, product_ids, n)
+    matrix = delta if matrix is None else resize(matrix, n) + delta
+    # the rows whose counts changed: every product bought along with another
+    touched = np.unique(delta.nonzero()[0])
+    r, c, s, rank = top_k(matrix, touched, k, min_score)
+    build_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    if rebuild:
+        # products that had recommendations and now have none lose them too
+        before_ids = RelatedProduct.objects.values_list('product_id', flat=True).distinct()
+        touched = np.union1d(touched, np.fromiter(before_ids, dtype=np.int64))
+    _write(r, c, s, rank, touched)
+    save_state(path, matrix, int(order_ids.max(initial=last_order_id)))
+    changed = [int(p) for p in touched]
+    if changed:
+        # the product pages' cache keys and ETags follow the related rows
+        # themselves; only nginx's copies of those pages need refreshing
+        microcache.changed(changed, with_catalog=False)
+    return {
+        'orders': len(np.unique(order_ids)), 'items': len(order_ids), 'products': len(changed), 'rows': len(r),
+        'read_s': read_s, 'build_s': build_s, 'write_s': time.perf_counter() - t,
+    }
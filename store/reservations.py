@@ -0,0 +1,134 @@
+"""Stock holds between checkout_prepare and the final checkout POST.
+
+A hold is a StockReservation row plus the same number of units added to
+``Product.reserved``; what can still be sold is ``stock - reserved``. Every
+counter change is a single-row conditional UPDATE (``reserved = reserved + n``
+guarded by ``stock >= reserved + n``), so buyers of one SKU contend only for
+that row's lock for the length of a short transaction, and a hold can never
+take units that aren't there.
+
+Each row's units are given back exactly once: whoever deletes the row (the
+buyer's checkout, a re-prepare, or the sweep_reservations command once it has
+expired) decrements ``reserved`` in the same transaction, and a delete that
+lost a race deletes nothing.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from . import orders
+from .models import Product, StockReservation
+
+HOLDER_SESSION_KEY = 'checkout_hold'
+
+
+def hold_seconds():
+    return getattr(settings, 'RESERVATION_HOLD_SECONDS', 600)
+
+
+def available(pids):
+    """{pid: units still for sale} for ``pids``, in one query."""
+    rows = Product.objects.filter(product_id__in=pids).values_list('product_id', 'stock', 'reserved')
+    return {pid: max(stock - reserved, 0) for pid, stock, reserved in rows}
+
+
+def _delete(rows, locked):
+    """Delete reservation ``rows``; returns the ones this call actually removed.
+
+    With ``locked`` the rows are locked by this transaction, so one DELETE
+    removes them all; otherwise each row is deleted on its own and a row some
+    other transaction got to first is left out.
+    """
+    if locked:
+        StockReservation.objects.filter(pk__in=[r.pk for r in rows]).delete()
+        return rows
+    return [r for r in rows if StockReservation.objects.filter(pk=r.pk).delete()[0]]
+
+
+def _units(rows):
+    units = Counter()
+    for r in rows:
+        units[r.product_id] += r.quantity
+    return dict(units)
+
+
+def give_back(units):
+    """Return ``units`` ({pid: n}) of released holds to what can be sold."""
+    if units:
+        Product.objects.filter(product_id__in=units).update(
+            reserved=Case(*(When(product_id=pid, then=F('reserved') - n) for pid, n in units.items()))
+        )
+
+
+def take_holds(holder):
+    """Delete all of ``holder``'s holds and return their {pid: units}.
+
+    Must run inside a transaction. ``Product.reserved`` is left to the caller:
+    place_order folds it into its stock UPDATE, ``release`` gives it back.
+    """
+    locked = connection.features.has_select_for_update
+    qs = StockReservation.objects.filter(holder=holder).only('reservation_id', 'product_id', 'quantity')
+    if locked:
+        qs = qs.select_for_update().order_by('product_id')
+    return _units(_delete(list(qs), locked))
+
+
+def release(holder):
+    """Give back every unit ``holder`` has on hold."""
+    with transaction.atomic():
+        units = take_holds(holder)
+        give_back(units)
+    return units
+
+
+def reserve(holder, quantities, seconds=None):
+    """Hold ``quantities`` ({pid: qty}) for ``holder`` for ``seconds`` (default hold_seconds()).
+
+    Replaces any holds the holder already had. All or nothing: raises
+    OutOfStock naming every line that can't be held. Returns the expiry time.
+    """
+    quantities = {int(pid): int(qty) for pid, qty in quantities.items() if int(qty) > 0}
+    if not quantities:
+        raise ValueError('No items to reserve')
+    expires_at = timezone.now() + timedelta(seconds=hold_seconds() if seconds is None else seconds)
+    with transaction.atomic():
+        previous = take_holds(holder)
+        short = set()
+        # ascending pid order, like place_order, so concurrent holders can't deadlock
+        for pid in sorted(set(quantities) | set(previous)):
+            delta = quantities.get(pid, 0) - previous.get(pid, 0)
+            if delta <= 0:
+                if delta:
+                    Product.objects.filter(product_id=pid).update(reserved=F('reserved') + delta)
+                continue
+            if not Product.objects.filter(product_id=pid, stock__gte=F('reserved') + delta).update(
+                    reserved=F('reserved') + delta):
+                short.add(pid)
+        if short:
+            raise orders.OutOfStock(short)
+        StockReservation.objects.bulk_create([
+            StockReservation(holder=holder, product_id=pid, quantity=qty, expires_at=expires_at)
+            for pid, qty in quantities.items()
+        ])
+    return expires_at
+
+
+def sweep_expired(batch_size=500, now=None):
+    """Release one batch of expired holds; returns how many were released.
+
+    Where the database supports SKIP LOCKED, concurrent sweepers (and buyers
+    converting a hold at the same moment) never wait on each other's rows.
+    """
+    qs = StockReservation.objects.filter(expires_at__lte=now or timezone.now())
+    qs = qs.only('reservation_id', 'product_id', 'quantity').order_by('expires_at')
+    locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        if locked:
+            qs = qs.select_for_update(skip_locked=True)
+        released = _delete(list(qs[:batch_size]), locked)
+        give_back(_units(released))
+    return len(released)
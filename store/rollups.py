@@ -0,0 +1,143 @@
+"""Sales rollups: orders and revenue per day, units and revenue per product.
+
+The 'order.placed' outbox handler counts each new order as it is written, and
+the build_sales_rollups command counts history in chunks (or, with --rebuild,
+recounts everything). ``Order.rolled_up`` is set in the same transaction that
+adds an order to the rollups, so an order is counted exactly once however
+often its event is delivered or a backfill runs over it. Orders deleted after
+they were counted stay in the rollups until the next rebuild.
+
+The incremental updates serialize on the rollup's RollupState row, which is
+what lets a rebuild pause them: while it runs, the handler raises RollupBusy
+and the outbox retries the event later.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .bulk_io import iter_keyset
+from .models import DailySales, Order, OrderItem, ProductSales, RollupState
+
+STATE = 'sales'
+
+
+class RollupBusy(Exception):
+    """The rollups can't take updates right now (rebuild running, or a concurrent update won)."""
+
+
+def _locked_state():
+    state, _ = RollupState.objects.select_for_update().get_or_create(name=STATE)
+    return state
+
+
+def _increment(model, key, deltas):
+    # UPDATE first: after a row's first order, that is all it takes
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:  # created concurrently
+        model.objects.filter(**key).update(**changes)
+
+
+def _deltas(order_ids):
+    days = defaultdict(lambda: {'orders': 0, 'units': 0, 'revenue': Decimal('0.00')})
+    products = defaultdict(lambda: {'units': 0, 'revenue': Decimal('0.00')})
+    for created_at, total in Order.objects.filter(order_id__in=order_ids).values_list('created_at', 'total_amount'):
+        day = days[timezone.localdate(created_at)]
+        day['orders'] += 1
+        day['revenue'] += total
+    items = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order__created_at', 'product_id', 'quantity', 'subtotal')
+    for created_at, pid, qty, subtotal in items:
+        days[timezone.localdate(created_at)]['units'] += qty
+        products[pid]['units'] += qty
+        products[pid]['revenue'] += subtotal
+    return days, products
+
+
+def _count(order_ids, recount=False):
+    # in a transaction holding the state row; ``recount`` ignores rolled_up (rebuild)
+    orders = Order.objects.filter(order_id__in=order_ids)
+    if not recount:
+        orders = orders.filter(rolled_up=False)
+    ids = list(orders.values_list('order_id', flat=True))
+    if not ids:
+        return 0
+    if orders.filter(order_id__in=ids).update(rolled_up=True) != len(ids):
+        raise RollupBusy('orders were counted concurrently')
+    days, products = _deltas(ids)
+    for day, deltas in sorted(days.items()):
+        _increment(DailySales, {'day': day}, deltas)
+    for pid, deltas in sorted(products.items()):
+        _increment(ProductSales, {'product_id': pid}, deltas)
+    return len(ids)
+
+
+def add_orders(order_ids):
+    """Count the orders among ``order_ids`` that aren't counted yet; returns how many were."""
+    with transaction.atomic():
+        if _locked_state().rebuilding:
+            raise RollupBusy('sales rollups are being rebuilt')
+        return _count(order_ids)
+
+
+def backfill(chunk_size=1000, progress=None):
+    """Count every order not counted yet, ``chunk_size`` orders per transaction."""
+    counted = 0
+    orders = Order.objects.filter(rolled_up=False).values('order_id')
+    for chunk in iter_keyset(orders, 'order_id', chunk_size):
+        counted += add_orders([row['order_id'] for row in chunk])
+        if progress:
+            progress(counted, chunk[-1]['order_id'])
+    return counted
+
+
+def rebuild(chunk_size=1000, progress=None, force=False):
+    """Recount everything from the orders table.
+
+    Incremental updates are paused for the duration (their events are retried
+    afterwards, and skip orders the rebuild already counted). ``force`` starts
+    even if a previous rebuild was killed before it could unpause them.
+    """
+    with transaction.atomic():
+        state = _locked_state()
+        if state.rebuilding and not force:
+            raise RollupBusy('a rebuild is already running')
+        state.rebuilding = True
+        state.save(update_fields=['rebuilding'])
+    counted = 0
+    try:
+        with transaction.atomic():
+            DailySales.objects.all().delete()
+            ProductSales.objects.all().delete()
+        # Orders committed while this runs are counted here if the walk
+        # reaches them, otherwise by their (paused) events afterwards.
+        for chunk in iter_keyset(Order.objects.values('order_id'), 'order_id', chunk_size):
+            with transaction.atomic():
+                _locked_state()
+                counted += _count([row['order_id'] for row in chunk], recount=True)
+            if progress:
+                progress(counted, chunk[-1]['order_id'])
+    finally:
+        RollupState.objects.filter(name=STATE).update(rebuilding=False, rebuilt_at=timezone.now())
+    return counted
+
+
+def dashboard(days=30, top=10):
+    """Everything the sales dashboard shows, from the rollup tables only."""
+    daily = list(DailySales.objects.order_by('-day')[:days])
+    return {
+        'daily': daily,
+        'orders': sum(d.orders for d in daily),
+        'units': sum(d.units for d in daily),
+        'revenue': sum((d.revenue for d in daily), Decimal('0.00')),
+        'top_products': list(ProductSales.objects.select_related('product').only(
+            'units', 'revenue', 'product__product_id', 'product__name').order_by('-units')[:top]),
+        'state': RollupState.objects.filter(name=STATE).first(),
+    }
@@ -0,0 +1,326 @@
+"""In-process inverted index for storefront product search.
+
+Active products' names and descriptions are tokenized into a term -> {product:
+weight} index, so a query only touches the postings of its own terms and never
+scans the product table. Each query token matches terms exactly, by prefix
+(for as-you-type search) and, for tokens of MIN_TYPO_LEN or more characters,
+within one edit (typos), with decreasing weight; results are ranked by
+tf-idf with name matches counting more than description matches.
+
+Every worker process keeps its own index, built on first use. Product
+changes are published as SearchChange rows (the pids that changed; the save
+and delete signals and ``products_changed`` write them once the change has
+committed). At most every CHECK_INTERVAL seconds, a process applies the rows
+it hasn't seen yet: it re-reads just those products from the primary and
+updates its index in place. The process that made a change also applies it at
+once. Rows are kept for KEEP_SECONDS; a process that fell further behind than
+that rebuilds.
+
+Rows younger than SETTLE_SECONDS are applied again on the next check, in case
+a row with a lower id committed after them. Applying a change twice is
+harmless.
+"""
+import heapq
+import math
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+CHECK_INTERVAL = 5
+SETTLE_SECONDS = 5
+KEEP_SECONDS = 24 * 3600
+PRUNE_EVERY = 1000      # changes between deletions of old ones, on average
+CATCH_UP_CHUNK = 2000
+PRUNED = 'search.pruned'  # CacheVersion row: the last SearchChange id deleted
+MIN_TYPO_LEN = 4
+MAX_EXPANSIONS = 50
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+EXACT, PREFIX, TYPO = 1.0, 0.7, 0.5
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution
+    or transposition of adjacent characters."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.postings = {}      # term -> {pid: weight}
+            self.doc_terms = {}     # pid -> terms, for removal
+            self.names = {}         # pid -> name, for autocomplete
+            self.typos = {}         # one-deletion variant -> terms
+            self._vocab = []        # sorted terms, for prefix lookups
+            self._vocab_dirty = False
+            self.version = None
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, pid, name, description=''):
+        weights = {}
+        for term in tokenize(name):
+            weights[term] = weights.get(term, 0) + NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+        with self._lock:
+            self.remove(pid)
+            for term, weight in weights.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    self._vocab_dirty = True
+                    if len(term) >= MIN_TYPO_LEN:
+                        for variant in _deletes(term):
+                            self.typos.setdefault(variant, set()).add(term)
+                postings[pid] = weight
+            self.doc_terms[pid] = tuple(weights)
+            self.names[pid] = name
+
+    def remove(self, pid):
+        with self._lock:
+            for term in self.doc_terms.pop(pid, ()):
+                postings = self.postings[term]
+                postings.pop(pid, None)
+                if not postings:
+                    del self.postings[term]
+                    self._vocab_dirty = True
+                    if len(term) >= MIN_TYPO_LEN:
+                        for variant in _deletes(term):
+                            terms = self.typos.get(variant)
+                            if terms is not None:
+                                terms.discard(term)
+                                if not terms:
+                                    del self.typos[variant]
+            self.names.pop(pid, None)
+
+    def _prefix_terms(self, token):
+        if self._vocab_dirty:
+            self._vocab = sorted(self.postings)
+            self._vocab_dirty = False
+        vocab = self._vocab
+        i = bisect_left(vocab, token)
+        found = []
+        while i < len(vocab) and vocab[i].startswith(token) and len(found) < MAX_EXPANSIONS:
+            found.append(vocab[i])
+            i += 1
+        return found
+
+    def _typo_terms(self, token):
+        if len(token) < MIN_TYPO_LEN:
+            return set()
+        candidates = set(self.typos.get(token, ()))
+        for variant in _deletes(token) | {token}:
+            candidates.update(self.typos.get(variant, ()))
+            if variant in self.postings:
+                candidates.add(variant)
+        return {t for t in candidates if _within_one_edit(token, t)}
+
+    def _expand(self, token):
+        """{term: match weight} for one query token."""
+        terms = {}
+        for term in self._typo_terms(token):
+            terms[term] = TYPO
+        for term in self._prefix_terms(token):
+            terms[term] = PREFIX
+        if token in self.postings:
+            terms[token] = EXACT
+        return terms
+
+    def search(self, query, limit=20):
+        """Return up to ``limit`` ``(pid, score)`` pairs, best first.
+
+        Every query token must match; if that finds nothing, products
+        matching any token are returned instead.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self.doc_terms) or 1
+            per_token = []
+            for token in tokens:
+                scores = {}
+                for term, match in self._expand(token).items():
+                    postings = self.postings[term]
+                    idf = math.log(1 + n_docs / len(postings))
+                    for pid, weight in postings.items():
+                        score = weight * idf * match
+                        if score > scores.get(pid, 0):
+                            scores[pid] = score
+                per_token.append(scores)
+        per_token.sort(key=len)
+        matched = set(per_token[0]).intersection(*per_token[1:]) or set().union(*per_token)
+        return heapq.nlargest(limit, ((pid, sum(s.get(pid, 0) for s in per_token)) for pid in matched),
+                              key=lambda item: (item[1], -item[0]))
+
+
+index = SearchIndex()
+_build_lock = threading.Lock()
+_last_check = 0.0
+
+
+def _settled_id():
+    """The id up to which every change has certainly committed."""
+    from .models import SearchChange
+
+    cutoff = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    return SearchChange.objects.filter(created_at__lt=cutoff).aggregate(last=Max('id'))['last'] or 0
+
+
+def _pruned_id():
+    from .models import CacheVersion
+
+    return CacheVersion.objects.filter(name=PRUNED).values_list('version', flat=True).first() or 0
+
+
+def _apply(target, pids):
+    from .models import Product
+
+    rows = Product.objects.filter(pk__in=pids).values_list('product_id', 'name', 'description', 'status')
+    active = {pid: (name, description) for pid, name, description, status in rows if status == 'ACTIVE'}
+    for pid in pids:
+        if pid in active:
+            target.add(pid, *active[pid])
+        else:
+            target.remove(pid)
+
+
+def rebuild():
+    global index
+    from . import db_routing
+    from .models import Product
+
+    with _build_lock, db_routing.use_primary():
+        # changes from here on are applied on top by the next catch-up
+        version = max(_settled_id(), _pruned_id())
+        fresh = SearchIndex()
+        rows = Product.objects.filter(status='ACTIVE').values_list('product_id', 'name', 'description')
+        for pid, name, description in rows.iterator(chunk_size=2000):
+            fresh.add(pid, name, description)
+        fresh.version = version
+        index = fresh
+
+
+def catch_up():
+    """Apply the SearchChanges this process hasn't seen; rebuild if they were pruned."""
+    from . import db_routing
+    from .models import SearchChange
+
+    with _build_lock, db_routing.use_primary():
+        if index.version < _pruned_id():
+            stale = True
+        else:
+            stale = False
+            settled = _settled_id()
+            after = index.version
+            while True:
+                chunk = list(SearchChange.objects.filter(id__gt=after).order_by('id')
+                             .values_list('id', 'product_id')[:CATCH_UP_CHUNK])
+                if not chunk:
+                    break
+                _apply(index, {pid for _, pid in chunk})
+                after = chunk[-1][0]
+            index.version = max(index.version, settled)
+    if stale:
+        rebuild()
+
+
+def get_index():
+    """The process index, built first if missing and brought up to date at most every CHECK_INTERVAL seconds."""
+    global _last_check
+    now = time.monotonic()
+    if index.version is None:
+        _last_check = now
+        rebuild()
+    elif now - _last_check > CHECK_INTERVAL:
+        _last_check = now
+        catch_up()
+    return index
+
+
+def changed(pids):
+    """Publish changes to ``pids`` (saved, deleted or bulk-updated products) to every process."""
+    pids = sorted(set(pids))
+    if pids:
+        transaction.on_commit(lambda: _record(pids))
+
+
+def _record(pids):
+    from .models import SearchChange
+
+    SearchChange.objects.bulk_create([SearchChange(product_id=pid) for pid in pids], batch_size=1000)
+    if random.random() < len(pids) / PRUNE_EVERY:
+        _prune()
+
+
+def _prune():
+    from .models import CacheVersion, SearchChange
+
+    cutoff = timezone.now() - timedelta(seconds=KEEP_SECONDS)
+    last = SearchChange.objects.filter(created_at__lt=cutoff).aggregate(last=Max('id'))['last']
+    if not last:
+        return
+    # the marker first: a process that still needed the rows then rebuilds
+    if not CacheVersion.objects.filter(name=PRUNED).update(version=Greatest(F('version'), last)):
+        CacheVersion.objects.get_or_create(name=PRUNED, defaults={'version': last})
+    SearchChange.objects.filter(id__lte=last).delete()
+
+
+def product_changed(product):
+    """Update this process's index for one saved product and tell the others."""
+    if index.version is not None:
+        if product.status == 'ACTIVE':
+            index.add(product.pk, product.name, product.description)
+        else:
+            index.remove(product.pk)
+    changed([product.pk])
+
+
+def product_deleted(pid):
+    if index.version is not None:
+        index.remove(pid)
+    changed([pid])
+
+
+def mark_stale():
+    """Rebuild this process's index on next use, e.g. after the product table was replaced wholesale."""
+    index.version = None
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog_cache, images, search
+from .models import Product
+
+
+# Covers ProductForm saves in views_manage, ProductAdmin and the admin's bulk
+# delete_selected (which sends post_delete per row). Code that changes products
+# with QuerySet.update() or bulk_create() must call products_changed itself.
+# Invalidation waits for commit so a concurrent request can't re-cache the old row.
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    def invalidate():
+        catalog_cache.invalidate_products([instance.pk])
+        search.product_changed(instance)
+    transaction.on_commit(invalidate)
+    images.schedule(instance.image_url, [instance.pk])  # an outbox event, committed with the save
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+
+    def invalidate():
+        catalog_cache.invalidate_products([pk])
+        search.product_deleted(pk)
+    transaction.on_commit(invalidate)
+
+
+def products_changed(pids):
+    """Invalidate caches and indexes after a bulk change that sent no signals."""
+    pids = list(pids)
+    for start in range(0, len(pids), 1000):
+        Product.objects.filter(pk__in=pids[start:start + 1000]).touch()
+    catalog_cache.invalidate_products(pids)
+    search.changed(pids)
@@ -0,0 +1,82 @@
+"""collectstatic storage: minified, content-hashed and precompressed files.
+
+On top of ManifestStaticFilesStorage (``css/styles.<hash>.css`` names via
+staticfiles.json, so ``{% static %}`` URLs change whenever the content does)
+this minifies the project's own JS and CSS as they are collected and writes
+``.gz`` and ``.br`` siblings of every compressible file for nginx's
+``gzip_static`` / ``brotli_static``. Everything happens at collectstatic time;
+serving does no work.
+
+rjsmin, rcssmin and brotli are optional: without them files are collected
+unminified, or without ``.br`` siblings.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.xml', '.html', '.ico')
+MIN_COMPRESS_SIZE = 256
+# third-party files (Django admin) ship as their authors built them
+NO_MINIFY_PREFIXES = ('admin/',)
+
+
+def minify(name, text):
+    if name.endswith('.js') and rjsmin:
+        return rjsmin.jsmin(text)
+    if name.endswith('.css') and rcssmin:
+        return rcssmin.cssmin(text)
+    return text
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    def _minifiable(self, name):
+        return (name.endswith(('.js', '.css')) and '.min.' not in name
+                and not name.startswith(NO_MINIFY_PREFIXES))
+
+    def _save(self, name, content):
+        if self._minifiable(name):
+            content.seek(0)
+            content = ContentFile(minify(name, content.read().decode('utf-8')).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        written = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and not isinstance(processed, Exception):
+                written.add(name)
+                if hashed_name:
+                    written.add(hashed_name)
+            yield name, hashed_name, processed
+        for name in sorted(written):
+            if name.endswith(COMPRESSIBLE):
+                self._precompress(name)
+
+    def _precompress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) >= len(data):
+                continue
+            path = self.path(name + suffix)
+            # Storage.save would pick a new name if the file exists
+            with open(path, 'wb') as f:
+                f.write(compressed)
@@ -0,0 +1,50 @@
+"""Helpers for the stress_* commands.
+
+They run against throwaway test databases, created and dropped the way
+``manage.py test`` does it. That way their orders, outbox events and rollup
+updates never reach the real database, where the running outbox worker
+would email them and count them in the sales rollups.
+"""
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import OperationalError, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+RETRIES = 20
+
+
+@contextmanager
+def scratch_databases():
+    """Point every connection at a new test database for the duration of the block."""
+    for alias in connections:
+        db = connections[alias].settings_dict
+        if db['ENGINE'] == 'django.db.backends.sqlite3' and not db['TEST'].get('NAME'):
+            # a file, not the default in-memory database, whose shared-cache
+            # table locks fail concurrent writers at once instead of waiting
+            db['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), f'test_minishop_{alias}_{os.getpid()}.sqlite3')
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    old_config = runner.setup_databases()
+    try:
+        yield
+    finally:
+        connections.close_all()
+        runner.teardown_databases(old_config)
+        teardown_test_environment()
+
+
+def retry(func, retries=RETRIES):
+    """``func()``, run again after a random pause when the database reports
+    contention (a lock timeout, a deadlock, SQLite's "database is locked")."""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except OperationalError:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, min(2.0, 0.02 * 2 ** attempt)))
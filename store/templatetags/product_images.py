@@ -0,0 +1,30 @@
+from django import template
+from django.utils.html import format_html
+
+from store import images
+
+register = template.Library()
+
+CARD_SIZES = '(min-width: 768px) 25vw, (min-width: 576px) 33vw, 50vw'
+
+
+@register.simple_tag
+def product_picture(url, alt='', css_class='', sizes=CARD_SIZES, loading='lazy'):
+    """<picture> with WebP and JPEG srcsets for a product image, or a plain <img>
+    of the original until its derivatives exist."""
+    if not url:
+        return ''
+    webp = images.srcset(url, 'webp')
+    if not webp:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="{}">', url, css_class, alt, loading)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" loading="{}"></picture>',
+        webp, sizes, images.smallest(url, 320), images.srcset(url, 'jpeg'), sizes, css_class, alt, loading,
+    )
+
+
+@register.simple_tag
+def product_thumb(url, width=160):
+    """URL of the smallest derivative at least ``width`` pixels wide (original as fallback)."""
+    return images.smallest(url, width)
@@ -0,0 +1,121 @@
+import json
+from decimal import Decimal
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Order, OrderItem, Product
+from .views_manage import MANAGE_PAGE_SIZE
+
+# pages link static files without the collectstatic manifest
+plain_static_files = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+@plain_static_files
+class ListQueryCountTests(TestCase):
+    """Staff list pages run the same queries however many rows the page shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.rows = 0
+
+    def add_rows(self, total):
+        for i in range(self.rows, total):
+            product = Product.objects.create(name=f'Product {i}', price=Decimal('2.50'), stock=10)
+            order = Order.objects.create(customer_name=f'Customer {i}', customer_email=f'c{i}@example.com',
+                                         customer_phone='0', shipping_address='-', total_amount=Decimal('2.50'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=Decimal('2.50'),
+                                     subtotal=Decimal('2.50'))
+        self.rows = max(self.rows, total)
+
+    def assertConstantQueries(self, url, page_size):
+        """One row, then a half, a full and an overflowing page: the count never changes."""
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as one_row:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for rows in (page_size // 2, page_size, page_size + 1, 3 * page_size):
+            self.add_rows(rows)
+            with self.subTest(rows=rows), self.assertNumQueries(len(one_row)):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def assertConstantChangelist(self, model):
+        self.assertConstantQueries(reverse(f'admin:store_{model._meta.model_name}_changelist'),
+                                   admin.site._registry[model].list_per_page)
+
+    def test_product_changelist(self):
+        self.assertConstantChangelist(Product)
+
+    def test_order_changelist(self):
+        self.assertConstantChangelist(Order)
+
+    def test_orderitem_changelist(self):
+        self.assertConstantChangelist(OrderItem)
+
+    def test_manage_product_list(self):
+        self.assertConstantQueries(reverse('manage_product_list'), MANAGE_PAGE_SIZE)
+
+
+@plain_static_files
+class ProductEditTests(TestCase):
+    """Saving a product edit keeps the stock checkouts took while the form was open."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        self.product = Product.objects.create(name='Shoe', price=Decimal('10.00'), stock=10)
+
+    def edit(self, url, **changes):
+        context = self.client.get(url).context
+        form = context['adminform'].form if 'adminform' in context else context['form']
+        data = {name: field.widget.format_value(form[name].value()) or '' for name, field in form.fields.items()}
+        Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 3)  # a checkout meanwhile
+        data.update(changes)
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        return Product.objects.get(pk=self.product.pk)
+
+    def test_unchanged_stock_is_not_written(self):
+        product = self.edit(reverse('manage_product_edit', args=[self.product.pk]), name='Trail shoe')
+        self.assertEqual((product.name, product.stock), ('Trail shoe', 7))
+
+    def test_edited_stock_is_applied_as_a_change(self):
+        product = self.edit(reverse('manage_product_edit', args=[self.product.pk]), stock=15)
+        self.assertEqual(product.stock, 12)
+
+    def test_admin_edit(self):
+        product = self.edit(reverse('admin:store_product_change', args=[self.product.pk]), stock=15)
+        self.assertEqual(product.stock, 12)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Shoe', price=Decimal('10.00'), stock=10)
+
+    def batch(self, *ops):
+        return self.client.post(reverse('cart_batch_ajax'), json.dumps({'ops': list(ops)}),
+                                content_type='application/json')
+
+    def test_add_needs_a_positive_qty(self):
+        pid = self.product.pk
+        self.assertEqual(self.batch({'op': 'add', 'pid': pid, 'qty': 2}).json()['lines'][str(pid)]['qty'], 2)
+        for qty in (0, -1):
+            with self.subTest(qty=qty):
+                response = self.batch({'op': 'add', 'pid': pid, 'qty': qty})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.content, b'Invalid ops: op 0: invalid pid or qty')
+        self.assertEqual(self.batch({'op': 'set', 'pid': pid, 'qty': 2}).json()['lines'][str(pid)]['qty'], 2)
@@ -4,6 +4,10 @@ from . import views_manage
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('products/page/', views.catalog_page, name='catalog_page'),
+    path('products/availability/', views.product_availability, name='product_availability'),
+    path('search/', views.search_results, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
 
     # Cart & AJAX endpoints
@@ -11,11 +15,21 @@ urlpatterns = [
     path('cart/add_ajax/<int:pk>/', views.add_to_cart_ajax, name='add_to_cart_ajax'),
     path('cart/update_ajax/', views.cart_update_ajax, name='cart_update_ajax'),
     path('cart/summary_ajax/', views.cart_summary_ajax, name='cart_summary_ajax'),
+    path('cart/batch_ajax/', views.cart_batch_ajax, name='cart_batch_ajax'),
     path('cart/checkout_prepare/', views.checkout_prepare, name='checkout_prepare'),
     path('cart/update/<str:pid>/', views.cart_update, name='cart_update'),
 
     path('checkout/', views.checkout, name='checkout'),
     path('order/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
 
+    # Staff product management
+    path('manage/products/', views_manage.manage_product_list, name='manage_product_list'),
+    path('manage/products/add/', views_manage.manage_product_add, name='manage_product_add'),
+    path('manage/products/<int:pk>/edit/', views_manage.manage_product_edit, name='manage_product_edit'),
+    path('manage/products/<int:pk>/delete/', views_manage.manage_product_delete, name='manage_product_delete'),
+    path('manage/orders/export/', views_manage.manage_order_export, name='manage_order_export'),
+    path('manage/cache/stats/', views_manage.manage_cache_stats, name='manage_cache_stats'),
+    path('manage/sales/', views_manage.manage_sales_dashboard, name='manage_sales_dashboard'),
+    path('manage/outbox/stats/', views_manage.manage_outbox_stats, name='manage_outbox_stats'),
 
 ]
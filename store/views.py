@@ -1,40 +1,171 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Product, Order, OrderItem
+from .models import Product, Order
+from . import catalog, catalog_cache, metrics, microcache, recommendations, reservations, search
+from .db_routing import replica_reads
+from .cart import Cart, aensure_total, aload_cart, aload_prices, ensure_total, hydrate, load_prices, parse_ops
+from .orders import OutOfStock, place_order
+from django.contrib import messages
 from django.urls import reverse
 from decimal import Decimal
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.views.decorators.http import require_POST
+import hashlib
+import json
+import secrets
+from django.middleware.csrf import get_token
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.http import require_GET, require_POST
 
+SEARCH_LIMIT = 48
+AUTOCOMPLETE_LIMIT = 8
 
+
+def _home_etag(request):
+    sort = catalog.clean_sort(request.GET.get('sort'))
+    cursor = request.GET.get('cursor')
+    try:
+        products, next_cursor = catalog_cache.get_catalog_page(sort, cursor, catalog.PAGE_SIZE)
+    except catalog.InvalidCursor:
+        return None
+    return microcache.etag('home', sort, cursor, next_cursor, [(p.product_id, p.version) for p in products])
+
+
+@replica_reads
+@microcache.cacheable(_home_etag, keys=lambda request: ['catalog'])
 def home(request):
-    products = Product.objects.filter(status='ACTIVE')
-    return render(request, 'home.html', {'products': products})
+    sort = catalog.clean_sort(request.GET.get('sort'))
+    try:
+        products, next_cursor = catalog_cache.get_catalog_page(sort, request.GET.get('cursor'), catalog.PAGE_SIZE)
+    except catalog.InvalidCursor:
+        return redirect(reverse('home') + '?sort=' + sort)
+    return render(request, 'home.html', {
+        'cards': catalog_cache.render_cards(products),
+        'next_cursor': next_cursor,
+        'sort': sort,
+        'sorts': catalog.SORTS,
+    })
+
+
+@require_GET
+@replica_reads
+def catalog_page(request):
+    """JSON page of the catalog for infinite scroll (same cursors as `home`)."""
+    sort = catalog.clean_sort(request.GET.get('sort'))
+    limit = catalog.clean_limit(request.GET.get('limit', catalog.PAGE_SIZE))
+    try:
+        products, next_cursor = catalog_cache.get_catalog_page(sort, request.GET.get('cursor'), limit)
+    except catalog.InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor')
+    return JsonResponse({
+        'products': [
+            {'product_id': p.product_id, 'name': p.name, 'price': str(p.price), 'image_url': p.image_url,
+             'url': reverse('product_detail', args=[p.product_id])}
+            for p in products
+        ],
+        'html': ''.join(catalog_cache.render_cards(products)),
+        'next_cursor': next_cursor,
+        # live, unlike the cached cards: units left after other buyers' holds
+        'available': reservations.available([p.product_id for p in products]),
+    })
+
+
+@require_GET
+@replica_reads
+def product_availability(request):
+    """Available-to-sell counts for up to MAX_PAGE_SIZE ``ids`` (comma-separated)."""
+    try:
+        pids = [int(pid) for pid in request.GET.get('ids', '').split(',') if pid][:catalog.MAX_PAGE_SIZE]
+    except ValueError:
+        return HttpResponseBadRequest('Invalid ids')
+    return JsonResponse({'available': reservations.available(pids)})
+
+
+@replica_reads
+def search_results(request):
+    query = request.GET.get('q', '').strip()[:100]
+    products = []
+    if query:
+        hits = search.get_index().search(query, limit=SEARCH_LIMIT)
+        found = Product.objects.only(*catalog.CARD_FIELDS).in_bulk([pid for pid, _ in hits])
+        products = [found[pid] for pid, _ in hits if pid in found]
+    return render(request, 'search.html', {'query': query, 'cards': catalog_cache.render_cards(products)})
+
+
+@require_GET
+def search_autocomplete(request):
+    """Top matches by name for the navbar search box; served from the index alone."""
+    query = request.GET.get('q', '').strip()[:100]
+    ix = search.get_index()
+    hits = ix.search(query, limit=AUTOCOMPLETE_LIMIT) if query else []
+    return JsonResponse({'results': [
+        {'product_id': pid, 'name': ix.names[pid], 'url': reverse('product_detail', args=[pid])}
+        for pid, _ in hits if pid in ix.names
+    ]})
+
+
+def _product_validators(request, pk):
+    # (version, updated_at, related ids) of the page: the product's own version
+    # and those of the related products rendered into it, fetched once for
+    # both of condition()'s callbacks
+    if not hasattr(request, '_product_validators'):
+        row = Product.objects.filter(pk=pk).values_list('version', 'updated_at').first()
+        if row is not None:
+            related = recommendations.related_versions(pk)
+            version, updated_at = str(row[0]), row[1]
+            if related:
+                version += '-' + hashlib.sha1(repr([(rid, v) for rid, v, _ in related]).encode()).hexdigest()[:12]
+                updated_at = max([updated_at] + [changed for _, _, changed in related])
+            row = (version, updated_at, [rid for rid, _, _ in related])
+        request._product_validators = row
+    return request._product_validators
+
+
+def _product_etag(request, pk):
+    row = _product_validators(request, pk)
+    return microcache.etag('product', pk, row[0]) if row else None
+
+
+def _product_last_modified(request, pk):
+    row = _product_validators(request, pk)
+    return row[1] if row else None
+
+
+def _product_keys(request, pk):
+    row = _product_validators(request, pk)
+    return [f'product-{pid}' for pid in [pk] + (row[2] if row else [])]
 
 
+@replica_reads
+@microcache.cacheable(_product_etag, _product_last_modified, keys=_product_keys)
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST' and request.headers.get('x-requested-with') != 'XMLHttpRequest':
         # non-AJAX fallback (redirect)
+        product = get_object_or_404(Product.objects.only('product_id', 'price'), pk=pk)
         qty = int(request.POST.get('quantity', 1))
-        cart = request.session.get('cart', {})
-        cart_item = cart.get(str(product.product_id), {'qty': 0, 'name': product.name, 'price': str(product.price), 'image_url': product.image_url or ''})
-        cart_item['qty'] += qty
-        cart_item['image_url'] = product.image_url or ''
-        cart[str(product.product_id)] = cart_item
-        request.session['cart'] = cart
+        Cart(request.session).add(product.product_id, qty, product.price)
         return redirect('cart')
-    return render(request, 'product_detail.html', {'product': product})
+    row = _product_validators(request, pk)
+    if row is None:
+        raise Http404('No Product matches the given query.')
+    detail = catalog_cache.get_product_detail(pk, row[0], row[1], lambda: {
+        'product': get_object_or_404(Product, pk=pk),
+        'related': recommendations.related(pk),
+    })
+    # holds change far more often than the product, so the available count is
+    # loaded by AJAX (catalog.js), keeping the page cacheable
+    return render(request, 'product_detail.html', {'detail': detail, 'product_id': pk})
+
+
+def _cart_totals(cart):
+    return {'cart_count': cart.count, 'total_amount': str(ensure_total(cart))}
+
+
+async def _acart_totals(cart):
+    return {'cart_count': cart.count, 'total_amount': str(await aensure_total(cart))}
 
 
 def cart_view(request):
     """Render the cart page (kept as a regular view for /cart/)."""
-    cart = request.session.get('cart', {})
-    items = []
-    total = Decimal('0.00')
-    for pid, data in cart.items():
-        subtotal = Decimal(data['price']) * data['qty']
-        items.append({'product_id': pid, 'name': data['name'], 'qty': data['qty'], 'price': data['price'], 'subtotal': subtotal, 'image_url': data.get('image_url', '')})
-        total += subtotal
+    items, total = hydrate(Cart(request.session))
     return render(request, 'cart.html', {'items': items, 'total': total})
 
 
@@ -42,76 +173,95 @@ def cart_update(request, pid):
     """Non-AJAX fallback to update or remove an item in the cart and redirect to cart page."""
     if request.method != 'POST':
         return redirect('cart')
-    cart = request.session.get('cart', {})
+    cart = Cart(request.session)
+    if pid not in cart:
+        return redirect('cart')
     action = request.POST.get('action')
     if action == 'remove':
-        cart.pop(pid, None)
+        qty = 0
     else:
         try:
             qty = int(request.POST.get('quantity', 1))
         except (ValueError, TypeError):
             qty = 1
-        if qty <= 0:
-            cart.pop(pid, None)
-        else:
-            if pid in cart:
-                cart[pid]['qty'] = qty
-    request.session['cart'] = cart
+    cart.set(pid, qty, load_prices([pid]).get(pid))
     return redirect('cart')
 
-@require_POST
-def add_to_cart_ajax(request, pk):
-    product = get_object_or_404(Product, pk=pk)
+# The small, frequent cart endpoints are async so that under ASGI (uvicorn
+# workers) a slow client or DB wait doesn't hold a worker. They check the
+# method inline because require_POST only wraps async views on Django 5.0+.
+async def add_to_cart_ajax(request, pk):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        product = await Product.objects.only('product_id', 'price').aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
     try:
         qty = int(request.POST.get('quantity', 1))
     except (ValueError, TypeError):
         return HttpResponseBadRequest('Invalid quantity')
-    cart = request.session.get('cart', {})
-    pid = str(product.product_id)
-    item = cart.get(pid, {'qty': 0, 'name': product.name, 'price': str(product.price), 'image_url': product.image_url or ''})
-    item['qty'] += qty
-    item['image_url'] = product.image_url or ''
-    cart[pid] = item
-    request.session['cart'] = cart
-    total_count = sum(v['qty'] for v in cart.values())
-    return JsonResponse({'success': True, 'cart_count': total_count, 'item_qty': cart[pid]['qty']})
+    cart = await aload_cart(request.session)
+    cart.add(product.product_id, qty, product.price)
+    return JsonResponse({'success': True, 'cart_count': cart.count, 'item_qty': cart.qty(product.product_id)})
 
 
-@require_POST
-def cart_update_ajax(request):
+async def cart_update_ajax(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
     pid = request.POST.get('pid')
     if not pid:
         return HttpResponseBadRequest('Missing pid')
-    cart = request.session.get('cart', {})
+    cart = await aload_cart(request.session)
     if pid not in cart:
         return HttpResponseBadRequest('Item not in cart')
+    price = (await aload_prices([pid])).get(pid)
     action = request.POST.get('action')
     if action == 'remove':
-        cart.pop(pid, None)
-        request.session['cart'] = cart
-        total_count = sum(v['qty'] for v in cart.values())
-        total_amount = sum(Decimal(v['price']) * v['qty'] for v in cart.values())
-        return JsonResponse({'success': True, 'removed': True, 'cart_count': total_count, 'total_amount': str(total_amount)})
+        cart.remove(pid, price)
+        return JsonResponse({'success': True, 'removed': True, **await _acart_totals(cart)})
     try:
         qty = int(request.POST.get('quantity', 1))
     except (ValueError, TypeError):
         return HttpResponseBadRequest('Invalid quantity')
-    if qty <= 0:
-        cart.pop(pid, None)
-    else:
-        cart[pid]['qty'] = qty
-    request.session['cart'] = cart
-    item_subtotal = Decimal(cart[pid]['price']) * cart[pid]['qty'] if pid in cart else Decimal('0.00')
-    total_count = sum(v['qty'] for v in cart.values())
-    total_amount = sum(Decimal(v['price']) * v['qty'] for v in cart.values())
-    return JsonResponse({'success': True, 'cart_count': total_count, 'item_subtotal': str(item_subtotal), 'total_amount': str(total_amount)})
+    cart.set(pid, qty, price)
+    item_subtotal = price * cart.qty(pid) if price is not None else Decimal('0.00')
+    return JsonResponse({'success': True, 'item_subtotal': str(item_subtotal), **await _acart_totals(cart)})
 
 
-def cart_summary_ajax(request):
-    cart = request.session.get('cart', {})
-    total_count = sum(v['qty'] for v in cart.values())
-    total_amount = sum(Decimal(v['price']) * v['qty'] for v in cart.values())
-    return JsonResponse({'cart_count': total_count, 'total_amount': str(total_amount)})
+async def cart_summary_ajax(request):
+    """The cart badge, loaded by every page so that the pages themselves stay cacheable."""
+    response = JsonResponse(await _acart_totals(await aload_cart(request.session)))
+    # the cached pages don't render a CSRF token, so this sets the cookie cart.js sends back
+    get_token(request)
+    add_never_cache_headers(response)
+    return response
+
+
+@require_POST
+def cart_batch_ajax(request):
+    """Apply an ordered list of add/set/remove ops with one session load and save.
+
+    Accepts a JSON body ``{"ops": [...]}`` or a form field ``ops`` holding the
+    same JSON list (used by navigator.sendBeacon, which can't set headers).
+    """
+    try:
+        if request.content_type == 'application/json':
+            raw = json.loads(request.body or b'{}').get('ops')
+        else:
+            raw = json.loads(request.POST.get('ops', '[]'))
+        ops = parse_ops(raw)
+    except (ValueError, AttributeError) as exc:
+        return HttpResponseBadRequest(f'Invalid ops: {exc}')
+    cart = Cart(request.session)
+    prices = load_prices({pid for _, pid, _ in ops}) if ops else {}
+    touched, errors = cart.apply(ops, prices)
+    lines = {}
+    for pid in touched:
+        qty = cart.qty(pid)
+        price = prices.get(pid)
+        lines[pid] = {'qty': qty, 'subtotal': str(price * qty) if price is not None else None}
+    return JsonResponse({'success': not errors, 'lines': lines, 'errors': errors, **_cart_totals(cart)})
 
 
 @require_POST
@@ -124,58 +274,68 @@ def checkout_prepare(request):
     if not selected:
         return JsonResponse({'success': False, 'error': 'no_items_selected'})
     # ensure they exist in cart
-    cart = request.session.get('cart', {})
+    cart = Cart(request.session)
     selected_existing = [pid for pid in selected if pid in cart]
     if not selected_existing:
         return JsonResponse({'success': False, 'error': 'no_items_in_cart'})
+    # hold the stock until the checkout POST (or until the sweeper expires it)
+    holder = request.session.setdefault(reservations.HOLDER_SESSION_KEY, secrets.token_hex(16))
+    try:
+        expires_at = reservations.reserve(holder, {pid: cart.qty(pid) for pid in selected_existing})
+    except OutOfStock as exc:
+        return JsonResponse({'success': False, 'error': 'out_of_stock', 'pids': [str(pid) for pid in exc.pids],
+                             'available': reservations.available(exc.pids)})
     request.session['selected_for_checkout'] = selected_existing
-    return JsonResponse({'success': True, 'redirect': reverse('checkout')})
+    return JsonResponse({'success': True, 'redirect': reverse('checkout'), 'hold_expires_at': expires_at.isoformat()})
 
 
 def checkout(request):
-    cart = request.session.get('cart', {})
+    cart = Cart(request.session)
     selected = request.session.get('selected_for_checkout', [])
     if not selected:
         # No items prepared for checkout
-        from django.contrib import messages
         messages.warning(request, 'Please select at least one item to checkout.')
         return redirect('cart')
     # Filter cart to selected items
-    selected_items = {pid: cart[pid] for pid in selected if pid in cart}
+    selected_items = {pid: cart.qty(pid) for pid in selected if pid in cart}
     if not selected_items:
-        from django.contrib import messages
         messages.warning(request, 'Selected items are not in the cart.')
         return redirect('cart')
-    items = []
-    total = Decimal('0.00')
-    for pid, data in selected_items.items():
-        subtotal = Decimal(data['price']) * data['qty']
-        items.append({'product_id': pid, 'name': data['name'], 'qty': data['qty'], 'price': data['price'], 'subtotal': subtotal, 'image_url': data.get('image_url', '')})
-        total += subtotal
 
     if request.method == 'POST':
         # process order only for selected items
-        name = request.POST.get('name')
-        email = request.POST.get('email')
-        phone = request.POST.get('phone')
-        address = request.POST.get('address')
-        order = Order.objects.create(customer_name=name, customer_email=email, customer_phone=phone, shipping_address=address, total_amount=total)
-        for pid, data in selected_items.items():
-            product = Product.objects.get(product_id=int(pid))
-            qty = data['qty']
-            unit_price = Decimal(data['price'])
-            subtotal = unit_price * qty
-            OrderItem.objects.create(order=order, product=product, quantity=qty, unit_price=unit_price, subtotal=subtotal)
+        customer = {
+            'customer_name': request.POST.get('name'),
+            'customer_email': request.POST.get('email'),
+            'customer_phone': request.POST.get('phone'),
+            'shipping_address': request.POST.get('address'),
+        }
+        try:
+            order = place_order(customer, selected_items, holder=request.session.get(reservations.HOLDER_SESSION_KEY))
+        except OutOfStock as exc:
+            products = Product.objects.in_bulk(exc.pids)
+            names = ', '.join(products[pid].name if pid in products else f'#{pid}' for pid in exc.pids)
+            messages.error(request, f'Not enough stock for: {names}. Please adjust your cart.')
+            return redirect('cart')
         # remove purchased items from cart
+        prices = {str(pid): price for pid, price in order.items.values_list('product_id', 'unit_price')}
         for pid in selected_items:
-            cart.pop(pid, None)
-        request.session['cart'] = cart
+            cart.remove(pid, prices.get(pid))
         request.session.pop('selected_for_checkout', None)
+        request.session.pop(reservations.HOLDER_SESSION_KEY, None)
         return redirect(reverse('order_confirmation', args=[order.order_id]))
 
+    # show current database prices, which are what place_order charges
+    items, total = hydrate(cart, selected_items)
     return render(request, 'checkout.html', {'items': items, 'total': total})
 
 
+@replica_reads
 def order_confirmation(request, order_id):
     order = get_object_or_404(Order, order_id=order_id)
     return render(request, 'order_confirmation.html', {'order': order})
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (blocked from the public in compose/nginx.conf)."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,13 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from .models import Product
 from .forms import ProductForm
+from . import catalog_cache, outbox, rollups
+from .pagination import EstimatedCountPaginator
+from .bulk_io import FORMATS, order_export_blocks, parse_date_range
+
+MANAGE_PAGE_SIZE = 50
+
 
 @staff_member_required
 def manage_product_list(request):
-    products = Product.objects.all().order_by('-created_at')
-    return render(request, 'manage/product_list.html', {'products': products})
+    # newest first by primary key (creation order) so each page is an index range,
+    # and only the columns the table shows
+    products = Product.objects.only('product_id', 'name', 'price', 'stock', 'status').order_by('-product_id')
+    page = EstimatedCountPaginator(products, MANAGE_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'manage/product_list.html', {'products': page.object_list, 'page': page})
 
 @staff_member_required
 def manage_product_add(request):
@@ -42,3 +52,43 @@ def manage_product_delete(request, pk):
         messages.success(request, 'Product deleted')
         return redirect('manage_product_list')
     return render(request, 'manage/product_confirm_delete.html', {'product': product})
+
+@staff_member_required
+def manage_cache_stats(request):
+    """Catalog cache counters for the worker process that served this request."""
+    return JsonResponse(catalog_cache.stats())
+
+
+@staff_member_required
+def manage_sales_dashboard(request):
+    """Recent daily sales and top products, read from the rollup tables only."""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    context = rollups.dashboard(days=days)
+    context['days'] = days
+    return render(request, 'manage/sales_dashboard.html', context)
+
+
+@staff_member_required
+def manage_outbox_stats(request):
+    """Outbox queue depth, failures and lag (age of the oldest pending event)."""
+    return JsonResponse(outbox.stats())
+
+
+@staff_member_required
+def manage_order_export(request):
+    """Stream orders with their items for ?start=YYYY-MM-DD&end=YYYY-MM-DD as CSV or JSONL."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest('format must be csv or jsonl')
+    try:
+        start, end = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(order_export_blocks(fmt, start, end), content_type=content_type)
+    name = '_'.join(['orders'] + [v for v in (request.GET.get('start'), request.GET.get('end')) if v])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
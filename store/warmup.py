@@ -0,0 +1,86 @@
+"""Work a fresh server process would otherwise do during its first requests.
+
+Called by the gunicorn hooks in compose/gunicorn.conf.py before a worker
+takes traffic. ``warm_shared`` builds what every worker can share: compiled
+templates (kept by the cached template loader), the URL resolver with every
+pattern's regex compiled, and the search index. With ``preload_app`` it runs
+once in the master, and the forked workers share the result copy-on-write.
+``warm_worker`` does what can't be shared across a fork: it opens this
+process's database connections.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLResolver, get_resolver
+
+from . import search
+
+
+def _template_names(backend):
+    # every file under the template directories of the engine's loaders,
+    # including the app directories (admin and the like)
+    names = set()
+    for loader in backend.engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            for directory in inner.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        names.add(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    """Compile every template into the cached loader; returns (compiled, failed)."""
+    compiled = failed = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in _template_names(backend):
+            try:
+                backend.get_template(name)
+                compiled += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError):
+                failed += 1  # not a template (or one meant for another engine)
+    return compiled, failed
+
+
+def warm_urls():
+    """Build the URL resolver and compile every pattern; returns the number of patterns."""
+    def walk(resolver):
+        count = 0
+        for pattern in resolver.url_patterns:
+            pattern.pattern.regex  # compiled lazily on first access
+            count += walk(pattern) if isinstance(pattern, URLResolver) else 1
+        return count
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # populates the reverse lookup tables
+    return walk(resolver)
+
+
+def warm_shared():
+    """Templates, URLs and the search index; returns what was done, for the log."""
+    started = time.perf_counter()
+    compiled, failed = warm_templates()
+    patterns = warm_urls()
+    search.get_index()
+    # the index was read from the database: a connection must not survive
+    # into the forked workers, which would all share its socket
+    connections.close_all()
+    return {'templates': compiled, 'template_errors': failed, 'url_patterns': patterns,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def warm_worker():
+    """Open this process's database connections (if they persist between requests)."""
+    started = time.perf_counter()
+    opened = []
+    for alias in settings.DATABASES:
+        if connections[alias].settings_dict.get('CONN_MAX_AGE'):
+            connections[alias].ensure_connection()
+            opened.append(alias)
+    return {'connections': opened, 'seconds': round(time.perf_counter() - started, 3)}